@@ -7,33 +7,53 @@ import time
 from datetime import datetime
 
 from f1_extract_requirements import extract_requirements
-from f2_extract_evidence import extract_evidence
+from f2_extract_evidence import extract_evidence_with_rag_status, structure_resume
 from f3_score import calculate_scores
 from f4_generate_improvements import generate_improvements
 from f5_generate_interview_qa import generate_interview_qa
 from f6_quality_evaluation import evaluate_quality
 from f7_judge_evaluation import evaluate_with_judge
 from f8_generate_application_email import generate_application_email
-from email_draft import generate_email_draft
-from job_chat import ask_job_chat
-from models import RequirementType, ConfidenceLevel, QuoteSource
-from utils import verify_quote_in_text
+from email_draft import generate_email_draft, lacks_draft_material, extract_streaming_body
+from job_chat import stream_job_chat
+from models import RequirementType, ConfidenceLevel, QuoteSource, RequirementWithEvidence, Gap
+from utils import verify_quote_in_text, group_action_items_by_priority
 from pdf_export import generate_pdf
 from rag_error_handler import validate_rag_inputs, get_rag_status
 from input_validator import validate_inputs, validate_requirements_extracted
-from ui_components import render_requirements_by_category
+from ui_components import render_requirements_by_category, CATEGORY_LABELS
 from chat_interface import get_chat_response
 from exporter import export_analysis_to_md, export_email_to_txt, export_chat_to_md
+from llm_client import get_chat_llm
 import os
+import heapq
+import threading
+import traceback
+import uuid
+from typing import Callable, List, Optional
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# Top N抽出用のカテゴリ順位（Must優先）
+CATEGORY_RANK = {RequirementType.MUST: 0, RequirementType.WANT: 1}
+
+# 行動計画の優先度ごとの見出し（表示順）
+ACTION_PRIORITY_HEADINGS = (
+    ("A", "#### 🔴 優先度A（最優先・短期）"),
+    ("B", "#### 🟡 優先度B（中期）"),
+    ("C", "#### 🟢 優先度C（長期・余裕があれば）"),
+)
 
 
 def run_analysis_core(
     job_text: str,
     resume_text: str,
-    achievement_notes: str = None,
-    company_info: str = None,
-    emphasis_axes: list = None,
-    options: dict = None
+    achievement_notes: Optional[str] = None,
+    company_info: Optional[str] = None,
+    emphasis_axes: Optional[List[str]] = None,
+    options: Optional[dict] = None,
+    progress_callback: Optional[Callable[[str], None]] = None
 ) -> dict:
     """
     分析処理のコア関数（Streamlit UIに依存しない）
@@ -45,6 +65,7 @@ def run_analysis_core(
         company_info: 企業情報（オプション）
         emphasis_axes: 強調軸のリスト（オプション）
         options: オプション辞書（llm_provider, model_name, temperature等）
+        progress_callback: 各ステップの開始時に進捗メッセージを受け取る関数（オプション）
     
     Returns:
         dict: 分析結果の辞書
@@ -64,10 +85,9 @@ def run_analysis_core(
             - judge_evaluation: Judge評価（Noneの可能性あり）
             - rag_error_message: RAGエラーメッセージ（Noneの可能性あり）
             - rag_warning_message: RAG警告メッセージ（Noneの可能性あり）
+            - job_text: 求人票のテキスト（チャット・下書き生成用）
+            - company_info: 企業情報（Noneの可能性あり、チャット・下書き生成用）
     """
-    import time
-    from datetime import datetime
-    
     # デフォルト値の設定
     if options is None:
         options = {}
@@ -77,13 +97,23 @@ def run_analysis_core(
     # 実行時間計測開始
     start_time = time.time()
     
+    # F1と並行して職務経歴書のセクション分解を行うためのスレッド
+    background_executor = ThreadPoolExecutor(max_workers=1)
+    
     try:
-        # company_infoをoptionsに追加（F1, F4で使用）
+        # company_infoをoptionsに重ねる（F1, F4で使用、呼び出し元の辞書はコピーも変更もしない）
+        options = ChainMap({}, options or {})
         if company_info and company_info.strip():
-            options = options.copy() if options else {}
-            options["company_text"] = company_info.strip()
+            options.maps[0]["company_text"] = company_info.strip()
+        
+        # セクション分解は求人に依存しないため、F1の待ち時間に先行実行（比較モードでは投入済み）
+        if options.get("resume_sections_future") is None:
+            options.maps[0]["resume_sections_future"] = background_executor.submit(
+                structure_resume, resume_text, options
+            )
         
         # F1: 求人要件抽出
+        _notify_progress(progress_callback, "F1: 求人要件を抽出中...")
         requirements = extract_requirements(job_text, options)
         
         # 要件抽出結果の検証
@@ -93,20 +123,22 @@ def run_analysis_core(
             raise ValueError(f"要件抽出に失敗しました: {error_message}")
         
         # F2: 根拠抽出
-        options_with_notes = options.copy()
-        options_with_notes["achievement_notes"] = achievement_notes if achievement_notes else None
-        evidence_map = extract_evidence(resume_text, requirements, options_with_notes)
-        
-        # RAGエラーメッセージを取得
-        rag_error_message = options_with_notes.get("rag_error_message")
-        rag_warning_message = options_with_notes.get("rag_warning_message")
+        _notify_progress(progress_callback, f"F2: {len(requirements)}件の要件について職務経歴から根拠を抽出中...")
+        # RAGエラー/警告メッセージは戻り値で受け取る
+        evidence_map, rag_error_message, rag_warning_message = extract_evidence_with_rag_status(
+            resume_text,
+            requirements,
+            options.new_child({"achievement_notes": achievement_notes if achievement_notes else None})
+        )
         
         # F3: スコア計算
+        _notify_progress(progress_callback, "F3: スコアを計算中...")
         score_total, score_must, score_want, matched, gaps, summary = calculate_scores(
             requirements, evidence_map, emphasis_axes=emphasis_axes
         )
         
         # F4: 改善案生成
+        _notify_progress(progress_callback, f"F4: 改善案を生成中...（総合スコア {score_total}点）")
         improvements = generate_improvements(
             job_text, resume_text, requirements, matched, gaps, options
         )
@@ -121,10 +153,6 @@ def run_analysis_core(
         end_time = time.time()
         execution_time = end_time - start_time
         
-        # 実行時間計測終了
-        end_time = time.time()
-        execution_time = end_time - start_time
-        
         # 結果を辞書にまとめる
         result = {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -145,6 +173,8 @@ def run_analysis_core(
             "application_email": application_email,
             "rag_error_message": rag_error_message,
             "rag_warning_message": rag_warning_message,
+            "job_text": job_text,
+            "company_info": company_info,
         }
         
         return result
@@ -154,6 +184,53 @@ def run_analysis_core(
         execution_time = end_time - start_time
         # 例外を再発生（呼び出し元でキャッチされる）
         raise
+    finally:
+        # F1失敗時などに未使用のセクション分解を待たない
+        background_executor.shutdown(wait=False)
+
+
+# 分析結果ごとにsession_stateへ保持する生成物・表示状態のキー接頭辞（新しい分析の実行時に破棄する）
+_RESULT_CACHE_KEY_PREFIXES = ("pdf_bytes_", "analysis_md_", "req_list_")
+
+
+def _new_result_id() -> str:
+    """分析結果ごとの識別子を発行（id()は破棄後に再利用されうるため、生成物のキャッシュキーにはこれを使う）"""
+    return uuid.uuid4().hex
+
+
+def _clear_result_caches():
+    """前回までの分析結果に紐づく生成物（PDF等）と表示状態をsession_stateから破棄"""
+    for key in [k for k in st.session_state.keys() if k.startswith(_RESULT_CACHE_KEY_PREFIXES)]:
+        del st.session_state[key]
+
+
+def _notify_progress(progress_callback: Optional[Callable[[str], None]], message: str):
+    """進捗コールバックが指定されている場合のみ通知"""
+    if progress_callback is not None:
+        progress_callback(message)
+
+
+def _warmup():
+    """
+    初回利用時の遅延ロード（PDFフォント、デフォルトモデルのLLMクライアント生成等）を事前に済ませる
+
+    ユーザーが入力している間にバックグラウンドスレッドで実行する。
+    APIへのリクエストは行わず、失敗しても分析処理には影響しない。
+    """
+    try:
+        generate_pdf({"matched": [], "gaps": []})
+    except Exception:
+        pass
+
+    try:
+        # 各プロバイダーのデフォルトモデル・温度0（F1/F2の設定）のクライアントを生成しておく
+        # 再利用されるのはサイドバーでモデル名を未指定にした場合のみ（モデル名を指定した場合は分析時に生成される）
+        if os.getenv("OPENAI_API_KEY"):
+            get_chat_llm("openai", None, 0.0)
+        if os.getenv("ANTHROPIC_API_KEY"):
+            get_chat_llm("anthropic", None, 0.0)
+    except Exception:
+        pass
 
 
 def main():
@@ -164,6 +241,11 @@ def main():
         layout="wide"
     )
 
+    # 初回表示時のみ、入力中にバックグラウンドでウォームアップ
+    if "warmed" not in st.session_state:
+        st.session_state.warmed = True
+        threading.Thread(target=_warmup, daemon=True).start()
+
     # タイトル
     st.title("📊 AI応募適合度チェッカー")
     st.markdown("**求人票と職務経歴書を比較分析し、適合度を自動評価します**")
@@ -392,6 +474,8 @@ def main():
             "max_must": max_must,
             "max_want": max_want,
             "strict_mode": strict_mode,
+            # F2の要件単位の根拠キャッシュ（セッション内のみ。職務経歴書由来の根拠を他のユーザーと共有しない）
+            "evidence_cache": st.session_state.setdefault("_f2_cache", {}),
         }
 
         # 実行時間計測開始
@@ -400,110 +484,97 @@ def main():
 
         try:
             if compare_mode:
-                # 比較モード：複数の求人票に対して順番に実行
-                all_results = []
+                # 比較モード：複数の求人票を並列に実行（LLM呼び出しは待ち時間が支配的なためスレッドで十分）
+                # company_infoをoptionsに追加（ボタン押下型生成用に結果へ保存）
+                options_with_company = options.copy() if options else {}
+                if company_info and company_info.strip():
+                    options_with_company["company_text"] = company_info.strip()
                 
-                for idx, job_text_item in enumerate(job_texts, 1):
-                    st.markdown(f"### 📋 求人{idx}の分析中...")
-                    
-                    # company_infoをoptionsに追加（F1, F4で使用）
-                    options_with_company = options.copy() if options else {}
-                    if company_info and company_info.strip():
-                        options_with_company["company_text"] = company_info.strip()
-                    
-                    # F1: 求人要件抽出
-                    with st.spinner(f"⏳ 求人{idx} - F1: 求人要件を抽出中..."):
-                        requirements = extract_requirements(job_text_item, options_with_company)
-                    
-                    # 要件抽出結果の検証
-                    is_valid, error_message = validate_requirements_extracted(requirements)
-                    if not is_valid:
-                        st.error(f"❌ 求人{idx}の要件抽出に失敗しました:\n\n{error_message}")
-                        st.stop()
-                        return
-                    
-                    # F2: 根拠抽出
-                    with st.spinner(f"⏳ 求人{idx} - F2: 職務経歴から根拠を抽出中..."):
-                        # 実績メモをoptionsに追加
-                        options_with_notes = options.copy()
-                        options_with_notes["achievement_notes"] = achievement_notes if achievement_notes else None
-                        evidence_map = extract_evidence(resume_text, requirements, options_with_notes)
-                        
-                        # RAG状態を表示（最初の求人のみ表示）
-                        if idx == 1:
-                            rag_error = options_with_notes.get("rag_error_message")
-                            rag_warning = options_with_notes.get("rag_warning_message")
-                            # RAG検索で取得した根拠候補数を計算（各EvidenceのquotesからRAG由来をカウント）
-                            rag_evidence_count = 0
-                            for ev in evidence_map.values():
-                                if hasattr(ev, 'quotes') and ev.quotes:
-                                    rag_evidence_count += sum(1 for q in ev.quotes if q.source.value == "rag")
-                            
-                            # RAG状態表示（expander内）
-                            with st.expander("🔍 RAG検索状態", expanded=False):
-                                status, status_msg = get_rag_status(
-                                    achievement_notes,
-                                    rag_error,
-                                    rag_evidence_count
-                                )
-                                if status == "enabled":
-                                    st.success(f"✅ {status_msg}")
-                                elif status == "error":
-                                    st.error(f"❌ {status_msg}")
-                                elif status == "disabled":
-                                    st.info(f"ℹ️ {status_msg}")
-                                else:
-                                    st.info(f"ℹ️ {status_msg}")
-                                
-                                if rag_warning:
-                                    st.warning(f"⚠️ {rag_warning}")
-                    
-                    # F3: スコア計算
-                    with st.spinner(f"⏳ 求人{idx} - F3: スコアを計算中..."):
-                        score_total, score_must, score_want, matched, gaps, summary = calculate_scores(
-                            requirements, evidence_map, emphasis_axes=emphasis_axes_list
-                        )
-                    
-                    # F4: 改善案生成
-                    with st.spinner(f"⏳ 求人{idx} - F4: 改善案を生成中..."):
-                        improvements = generate_improvements(
-                            job_text_item, resume_text, requirements, matched, gaps, options_with_company
+                results_by_index = {}
+                failed_job = None  # (求人番号, 例外)
+                with st.spinner(f"⏳ {len(job_texts)}件の求人を並列で分析中..."):
+                    # 失敗時に実行中の他の求人を待たずに抜けられるよう、withを使わずに終了処理を行う
+                    executor = ThreadPoolExecutor(max_workers=len(job_texts) + 1)
+                    try:
+                        # 求人に依存しない職務経歴書のセクション分解を先行投入し、各求人のF2で共有
+                        options_for_jobs = ChainMap(
+                            {"resume_sections_future": executor.submit(structure_resume, resume_text, options)},
+                            options
                         )
-                    
-                    # F5/F6/F7/F8はボタン押下型に変更（コスト削減のため）
-                    interview_qas = None
-                    quality_evaluation = None
-                    judge_evaluation = None
-                    application_email = None
-                    
-                    # 結果を保存
+                        
+                        future_to_index = {
+                            executor.submit(
+                                run_analysis_core,
+                                job_text=job_text_item,
+                                resume_text=resume_text,
+                                achievement_notes=achievement_notes,
+                                company_info=company_info,
+                                emphasis_axes=emphasis_axes_list,
+                                options=options_for_jobs
+                            ): idx
+                            for idx, job_text_item in enumerate(job_texts, 1)
+                        }
+                        
+                        # 完了した求人から順に結果を表示
+                        for future in as_completed(future_to_index):
+                            idx = future_to_index[future]
+                            try:
+                                result = future.result()
+                            except Exception as e:
+                                # 要件抽出結果の検証エラーなど（残りの求人は待たずに中断）
+                                failed_job = (idx, e)
+                                break
+                            results_by_index[idx] = result
+                            st.success(f"✅ 求人{idx}の分析完了: 総合スコア {result['score_total']}点")
+                    finally:
+                        # 失敗時は未開始の求人をキャンセルし、実行中の求人の完了も待たない
+                        executor.shutdown(wait=failed_job is None, cancel_futures=True)
+                
+                if failed_job is not None:
+                    failed_idx, failed_error = failed_job
+                    st.error(f"❌ 求人{failed_idx}の分析に失敗しました:\n\n{failed_error}")
+                    st.stop()
+                
+                # RAG状態を表示（最初の求人のみ表示）
+                first_result = results_by_index[1]
+                _render_rag_status(
+                    achievement_notes,
+                    first_result.get("rag_error_message"),
+                    first_result.get("rag_warning_message"),
+                    first_result.get("evidence_map", {})
+                )
+                
+                # 求人の順番で結果をまとめる
+                all_results = []
+                for idx, job_text_item in enumerate(job_texts, 1):
+                    result = results_by_index[idx]
                     all_results.append({
+                        "result_id": _new_result_id(),  # 生成物のキャッシュキー用
                         "job_index": idx,
                         "job_text": job_text_item,
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "requirements": requirements,
-                        "evidence_map": evidence_map,
-                        "score_total": score_total,
-                        "score_must": score_must,
-                        "score_want": score_want,
-                        "matched": matched,
-                        "gaps": gaps,
-                        "summary": summary,
-                        "improvements": improvements,
-                        "interview_qas": interview_qas,  # ボタン押下型のためNone
-                        "quality_evaluation": quality_evaluation,  # ボタン押下型のためNone
-                        "judge_evaluation": judge_evaluation,  # ボタン押下型のためNone
-                        "application_email": application_email,  # ボタン押下型のためNone
+                        "timestamp": result["timestamp"],
+                        "requirements": result["requirements"],
+                        "evidence_map": result["evidence_map"],
+                        "score_total": result["score_total"],
+                        "score_must": result["score_must"],
+                        "score_want": result["score_want"],
+                        "matched": result["matched"],
+                        "gaps": result["gaps"],
+                        "summary": result["summary"],
+                        "improvements": result["improvements"],
+                        "interview_qas": result["interview_qas"],  # ボタン押下型のためNone
+                        "quality_evaluation": result["quality_evaluation"],  # ボタン押下型のためNone
+                        "judge_evaluation": result["judge_evaluation"],  # ボタン押下型のためNone
+                        "application_email": result["application_email"],  # ボタン押下型のためNone
                         "options": options_with_company,  # ボタン押下型生成用
                     })
-                    
-                    st.success(f"✅ 求人{idx}の分析完了: 総合スコア {score_total}点")
                 
                 # 実行時間計測終了
                 end_time = time.time()
                 execution_time = end_time - start_time
                 
-                # 結果をsession_stateに保存（比較モード用）
+                # 結果をsession_stateに保存（比較モード用、前回の結果に紐づく生成物は破棄）
+                _clear_result_caches()
                 st.session_state.compare_results = {
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "execution_time": execution_time,
@@ -515,6 +586,9 @@ def main():
             else:
                 # 通常モード：1つの求人票に対して実行
                 with st.spinner("⏳ 分析を実行中..."):
+                    # 各ステップの進捗を表示（完了まで画面が固まって見えないように）
+                    progress_placeholder = st.empty()
+                    
                     # コア関数を呼び出し
                     result = run_analysis_core(
                         job_text=job_text,
@@ -522,53 +596,44 @@ def main():
                         achievement_notes=achievement_notes,
                         company_info=company_info if 'company_info' in locals() else None,
                         emphasis_axes=emphasis_axes_list,
-                        options=options
+                        options=options,
+                        progress_callback=lambda message: progress_placeholder.info(f"⏳ {message}")
                     )
+                    progress_placeholder.empty()
                     
                     # RAG状態を表示
-                    rag_error = result.get("rag_error_message")
-                    rag_warning = result.get("rag_warning_message")
-                    # RAG検索で取得した根拠候補数を計算（各EvidenceのquotesからRAG由来をカウント）
-                    rag_evidence_count = 0
-                    for ev in result.get("evidence_map", {}).values():
-                        if hasattr(ev, 'quotes') and ev.quotes:
-                            rag_evidence_count += sum(1 for q in ev.quotes if q.source.value == "rag")
-                    
-                    # RAG状態表示（expander内）
-                    with st.expander("🔍 RAG検索状態", expanded=False):
-                        status, status_msg = get_rag_status(
-                            achievement_notes,
-                            rag_error,
-                            rag_evidence_count
-                        )
-                        if status == "enabled":
-                            st.success(f"✅ {status_msg}")
-                        elif status == "error":
-                            st.error(f"❌ {status_msg}")
-                        elif status == "disabled":
-                            st.info(f"ℹ️ {status_msg}")
-                        else:
-                            st.info(f"ℹ️ {status_msg}")
-                        
-                        if rag_warning:
-                            st.warning(f"⚠️ {rag_warning}")
+                    _render_rag_status(
+                        achievement_notes,
+                        result.get("rag_error_message"),
+                        result.get("rag_warning_message"),
+                        result.get("evidence_map", {})
+                    )
                     
-                    # 各ステップの成功メッセージを表示
-                    st.success(f"✅ F1完了: {len(result['requirements'])}件の要件を抽出")
-                    st.success(f"✅ F2完了: {len(result['evidence_map'])}件の根拠を分析")
-                    st.success(f"✅ F3完了: 総合スコア {result['score_total']}点")
-                    st.success(f"✅ F4完了: {len(result['improvements'].action_items)}件の行動計画を生成")
+                    # 各ステップの成功メッセージを表示（完了分・未実行分をそれぞれ1ブロックにまとめる）
+                    completed_steps = [
+                        f"✅ F1完了: {len(result['requirements'])}件の要件を抽出",
+                        f"✅ F2完了: {len(result['evidence_map'])}件の根拠を分析",
+                        f"✅ F3完了: 総合スコア {result['score_total']}点",
+                        f"✅ F4完了: {len(result['improvements'].action_items)}件の行動計画を生成",
+                    ]
+                    pending_steps = []
                     if result.get('interview_qas') and result['interview_qas'].qa_list:
-                        st.success(f"✅ F5完了: {len(result['interview_qas'].qa_list)}件のQ&Aを生成")
+                        completed_steps.append(f"✅ F5完了: {len(result['interview_qas'].qa_list)}件のQ&Aを生成")
                     else:
-                        st.info("ℹ️ F5（面接想定Q&A）はボタン押下で生成できます")
+                        pending_steps.append("ℹ️ F5（面接想定Q&A）はボタン押下で生成できます")
                     if result.get('quality_evaluation'):
-                        st.success(f"✅ F6完了: 総合品質スコア {result['quality_evaluation'].overall_score:.1f}点")
+                        completed_steps.append(f"✅ F6完了: 総合品質スコア {result['quality_evaluation'].overall_score:.1f}点")
                     else:
-                        st.info("ℹ️ F6（品質評価）はボタン押下で実行できます")
+                        pending_steps.append("ℹ️ F6（品質評価）はボタン押下で実行できます")
+                    
+                    st.success("\n\n".join(completed_steps))
+                    if pending_steps:
+                        st.info("\n\n".join(pending_steps))
 
-                # 結果をsession_stateに保存
+                # 結果をsession_stateに保存（前回の結果に紐づく生成物は破棄）
+                _clear_result_caches()
                 st.session_state.result = {
+                    "result_id": _new_result_id(),  # 生成物のキャッシュキー用
                     "timestamp": result["timestamp"],
                     "execution_time": result["execution_time"],
                     "requirements": result["requirements"],
@@ -594,7 +659,6 @@ def main():
 
         except Exception as e:
             st.error(f"❌ エラーが発生しました: {e}")
-            import traceback
             with st.expander("詳細なエラー情報"):
                 st.code(traceback.format_exc())
             return
@@ -649,9 +713,17 @@ def main():
         st.divider()
         st.header("📊 分析結果")
 
-        # PDFダウンロードボタン
-        try:
-            pdf_bytes = generate_pdf(result)
+        # PDFダウンロードボタン（ボタン押下型：再実行のたびにPDFを生成しないよう、生成結果をsession_stateに保持）
+        pdf_key = f"pdf_bytes_{result['result_id']}"
+        if pdf_key not in st.session_state:
+            if st.button("📄 PDFレポートを作成", key=f"gen_pdf_{result['result_id']}"):
+                try:
+                    st.session_state[pdf_key] = generate_pdf(result)
+                except Exception as e:
+                    st.warning(f"⚠️ PDF生成に失敗しました: {e}")
+        
+        pdf_bytes = st.session_state.get(pdf_key)
+        if pdf_bytes:
             st.download_button(
                 label="📥 PDFレポートをダウンロード",
                 data=pdf_bytes,
@@ -659,8 +731,6 @@ def main():
                 mime="application/pdf",
                 use_container_width=False
             )
-        except Exception as e:
-            st.warning(f"⚠️ PDF生成に失敗しました: {e}")
 
         st.divider()
 
@@ -682,6 +752,42 @@ def main():
             st.markdown(f"**ギャップ数**: {len(result.get('gaps', []))}件")
 
 
+def _render_rag_status(achievement_notes: str, rag_error: str, rag_warning: str, evidence_map: dict):
+    """
+    RAG検索状態をexpander内に表示
+    
+    Args:
+        achievement_notes: 実績メモ
+        rag_error: RAGエラーメッセージ（Noneの可能性あり）
+        rag_warning: RAG警告メッセージ（Noneの可能性あり）
+        evidence_map: 根拠マップ（RAG由来の引用数の集計に使用）
+    """
+    # RAG検索で取得した根拠候補数を計算（各EvidenceのquotesからRAG由来をカウント）
+    rag_evidence_count = 0
+    for ev in evidence_map.values():
+        if hasattr(ev, 'quotes') and ev.quotes:
+            rag_evidence_count += sum(1 for q in ev.quotes if q.source.value == "rag")
+    
+    # RAG状態表示（expander内）
+    with st.expander("🔍 RAG検索状態", expanded=False):
+        status, status_msg = get_rag_status(
+            achievement_notes,
+            rag_error,
+            rag_evidence_count
+        )
+        if status == "enabled":
+            st.success(f"✅ {status_msg}")
+        elif status == "error":
+            st.error(f"❌ {status_msg}")
+        elif status == "disabled":
+            st.info(f"ℹ️ {status_msg}")
+        else:
+            st.info(f"ℹ️ {status_msg}")
+        
+        if rag_warning:
+            st.warning(f"⚠️ {rag_warning}")
+
+
 def _render_single_result(result_dict: dict, resume_text: str, job_text: str = None, company_info: str = None):
     """
     単一の分析結果を表示（通常モードと比較モードで共通使用）
@@ -697,65 +803,42 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
         result_dict['job_text'] = job_text
     if company_info:
         result_dict['company_info'] = company_info
-    # メトリクス表示
-    col_m1, col_m2, col_m3, col_m4 = st.columns(4)
-
-    with col_m1:
-        st.metric(
-            label="総合スコア",
-            value=f"{result_dict['score_total']}点",
-            delta=None
-        )
-
-    with col_m2:
-        st.metric(
-            label="Mustスコア",
-            value=f"{result_dict['score_must']}点",
-            delta=None
-        )
-
-    with col_m3:
-        st.metric(
-            label="Wantスコア",
-            value=f"{result_dict['score_want']}点",
-            delta=None
-        )
-
-    with col_m4:
-        st.metric(
-            label="マッチ数/ギャップ数",
-            value=f"{len(result_dict['matched'])}/{len(result_dict['gaps'])}",
-            delta=None
-        )
-
-    # 差分サマリ（強みTop3 + 致命的ギャップTop3）
+    # メトリクス表示（4列を1回のループで描画）
+    metrics = [
+        ("総合スコア", f"{result_dict['score_total']}点"),
+        ("Mustスコア", f"{result_dict['score_must']}点"),
+        ("Wantスコア", f"{result_dict['score_want']}点"),
+        ("マッチ数/ギャップ数", f"{len(result_dict['matched'])}/{len(result_dict['gaps'])}"),
+    ]
+    for col, (label, value) in zip(st.columns(4), metrics):
+        col.metric(label=label, value=value, delta=None)
+
+    # 差分サマリ（強みTop3 + 致命的ギャップTop3、各列1要素にまとめて描画）
     st.subheader("⚡ 差分サマリ")
     col_summary1, col_summary2 = st.columns(2)
 
-    with col_summary1:
-        # 強みTop3を抽出
-        top_strengths = _get_top_strengths(result_dict['matched'], top_n=3)
-        if top_strengths:
-            st.markdown("**✅ 強みTop3**")
-            for i, m in enumerate(top_strengths, 1):
-                category_label = "Must" if m.requirement.category == RequirementType.MUST else "Want"
-                confidence_label = f"{m.evidence.confidence:.0%}"
-                st.markdown(f"{i}. **{m.requirement.description}** ({category_label}, 一致度: {confidence_label})")
-        else:
-            st.markdown("**✅ 強みTop3**")
-            st.markdown("*強みが見つかりませんでした*")
-
-    with col_summary2:
-        # 致命的ギャップTop3を抽出
-        top_gaps = _get_top_critical_gaps(result_dict['gaps'], top_n=3)
-        if top_gaps:
-            st.markdown("**⚠️ 致命的ギャップTop3**")
-            for i, g in enumerate(top_gaps, 1):
-                category_label = "Must" if g.requirement.category == RequirementType.MUST else "Want"
-                st.markdown(f"{i}. **{g.requirement.description}** ({category_label})")
-        else:
-            st.markdown("**⚠️ 致命的ギャップTop3**")
-            st.markdown("*致命的なギャップはありません*")
+    # 強みTop3を抽出
+    top_strengths = _get_top_strengths(result_dict['matched'], top_n=3)
+    if top_strengths:
+        strengths_body = "\n".join(
+            f"{i}. **{m.requirement.description}** "
+            f"({CATEGORY_LABELS.get(m.requirement.category, 'Want')}, 一致度: {m.evidence.confidence:.0%})"
+            for i, m in enumerate(top_strengths, 1)
+        )
+    else:
+        strengths_body = "*強みが見つかりませんでした*"
+    col_summary1.markdown(f"**✅ 強みTop3**\n\n{strengths_body}")
+
+    # 致命的ギャップTop3を抽出
+    top_gaps = _get_top_critical_gaps(result_dict['gaps'], top_n=3)
+    if top_gaps:
+        gaps_body = "\n".join(
+            f"{i}. **{g.requirement.description}** ({CATEGORY_LABELS.get(g.requirement.category, 'Want')})"
+            for i, g in enumerate(top_gaps, 1)
+        )
+    else:
+        gaps_body = "*致命的なギャップはありません*"
+    col_summary2.markdown(f"**⚠️ 致命的ギャップTop3**\n\n{gaps_body}")
 
     st.divider()
 
@@ -769,7 +852,8 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
     render_requirements_by_category(
         result_dict['matched'],
         result_dict['gaps'],
-        resume_text
+        resume_text,
+        result_dict['result_id']
     )
 
     # 改善案
@@ -798,31 +882,17 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
         if improvements.action_items:
             st.markdown(f"### 🎯 行動計画（{len(improvements.action_items)}件）")
 
-            # 優先度別にグループ化
-            priority_a = [a for a in improvements.action_items if a.priority == "A"]
-            priority_b = [a for a in improvements.action_items if a.priority == "B"]
-            priority_c = [a for a in improvements.action_items if a.priority == "C"]
-
-            if priority_a:
-                st.markdown("#### 🔴 優先度A（最優先・短期）")
-                for a in priority_a:
-                    st.markdown(f"- **{a.action}**")
-                    st.markdown(f"  - 根拠: {a.rationale}")
-                    st.markdown(f"  - 期待効果: {a.estimated_impact}")
-
-            if priority_b:
-                st.markdown("#### 🟡 優先度B（中期）")
-                for a in priority_b:
-                    st.markdown(f"- **{a.action}**")
-                    st.markdown(f"  - 根拠: {a.rationale}")
-                    st.markdown(f"  - 期待効果: {a.estimated_impact}")
-
-            if priority_c:
-                st.markdown("#### 🟢 優先度C（長期・余裕があれば）")
-                for a in priority_c:
-                    st.markdown(f"- **{a.action}**")
-                    st.markdown(f"  - 根拠: {a.rationale}")
-                    st.markdown(f"  - 期待効果: {a.estimated_impact}")
+            # 優先度別にグループ化（1回の走査で振り分け）
+            action_items_by_priority = group_action_items_by_priority(improvements.action_items)
+
+            for priority, heading in ACTION_PRIORITY_HEADINGS:
+                priority_items = action_items_by_priority[priority]
+                if priority_items:
+                    st.markdown(heading)
+                    st.markdown("\n".join(
+                        f"- **{a.action}**\n  - 根拠: {a.rationale}\n  - 期待効果: {a.estimated_impact}"
+                        for a in priority_items
+                    ))
 
     st.divider()
 
@@ -1063,6 +1133,25 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
     if email_draft_key not in st.session_state:
         st.session_state[email_draft_key] = None
     
+    # 入力が短い・マッチが無い場合はテンプレートで作成されるため、事前に案内してLLM生成を選べるようにする
+    uses_template = lacks_draft_material(
+        result_dict.get('job_text') or "",
+        result_dict.get('resume_text') or "",
+        result_dict.get('requirements') or [],
+        result_dict.get('matched') or []
+    )
+    force_llm = False
+    if uses_template:
+        st.info(
+            "ℹ️ 入力が短い、またはマッチした要件が無いため、下書きはテンプレートで作成されます。"
+            "LLMで生成する場合は下のチェックを入れてください。"
+        )
+        force_llm = st.checkbox(
+            "テンプレートを使わずLLMで生成する",
+            value=False,
+            key=f"force_llm_draft_{result_dict['result_id']}"
+        )
+    
     # 生成ボタン
     generate_draft_button = st.button(
         "📝 応募メール下書きを生成",
@@ -1083,6 +1172,17 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
                         "model_name": None
                     }
                 
+                # 生成中の本文を逐次表示（JSONの他フィールドは表示しない）
+                stream_placeholder = st.empty()
+                streamed_chunks = []
+                
+                def _show_streamed_token(token: str):
+                    streamed_chunks.append(token)
+                    body = extract_streaming_body("".join(streamed_chunks))
+                    if body:
+                        stream_placeholder.text(body)
+                
+                options_for_draft = {**options_for_draft, "on_token": _show_streamed_token, "force_llm": force_llm}
                 email_draft = generate_email_draft(
                     job_text=result_dict.get('job_text', ''),
                     resume_text=result_dict.get('resume_text', ''),
@@ -1095,8 +1195,12 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
                     contact_person=contact_person.strip() if contact_person else None,
                     options=options_for_draft
                 )
+                stream_placeholder.empty()
                 st.session_state[email_draft_key] = email_draft
-                st.success("✅ 応募メール下書きを生成しました")
+                if uses_template and not force_llm:
+                    st.success("✅ 応募メール下書きをテンプレートで作成しました")
+                else:
+                    st.success("✅ 応募メール下書きを生成しました")
             except Exception as e:
                 st.error(f"❌ 応募メール下書きの生成に失敗しました: {e}")
     
@@ -1150,6 +1254,90 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
     st.subheader("🧠 求人深掘りチャット")
     st.markdown("**求人の解釈、応募戦略、応募メールの改善案を質問できます**")
     
+    # session_stateにチャット履歴を保持（結果ごとに独立、モードごとに分離）
+    job_chat_key_base = f"job_chat_history_{id(result_dict)}"
+    
+    # チャットUIは開いたときだけ描画（未使用時の再実行コストを削減）
+    show_chat = st.toggle("💬 チャットを開く", key=f"show_chat_{id(result_dict)}")
+    if show_chat:
+        _render_job_chat(result_dict, job_chat_key_base)
+    
+    st.divider()
+    
+    # ダウンロードセクション
+    st.subheader("⬇️ ダウンロード")
+    st.markdown("**分析結果、応募メール下書き、チャット履歴をダウンロードできます**")
+    
+    # ダウンロード用のキー（結果ごとに独立）
+    download_key_base = f"download_{id(result_dict)}"
+    
+    # 1. 分析結果のダウンロード
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        # 分析結果は分析後に変わらないため、再描画のたびに組み立て直さないようsession_stateに保持
+        analysis_md_key = f"analysis_md_{result_dict['result_id']}"
+        if analysis_md_key not in st.session_state:
+            st.session_state[analysis_md_key] = export_analysis_to_md(result_dict).encode('utf-8')
+        st.download_button(
+            label="📄 分析結果をダウンロード (MD)",
+            data=st.session_state[analysis_md_key],
+            file_name="analysis_result.md",
+            mime="text/markdown",
+            key=f"{download_key_base}_analysis"
+        )
+    
+    # 2. 応募メール下書きのダウンロード
+    with col2:
+        email_draft = st.session_state.get(email_draft_key)
+        if email_draft:
+            email_txt = export_email_to_txt(email_draft)
+            st.download_button(
+                label="📧 応募メール下書きをダウンロード (TXT)",
+                data=email_txt.encode('utf-8'),
+                file_name="email_draft.txt",
+                mime="text/plain",
+                key=f"{download_key_base}_email"
+            )
+        else:
+            st.info("💡 応募メール下書きを生成するとダウンロードできます")
+    
+    # 3. チャット履歴のダウンロード
+    with col3:
+        # チャット履歴を取得（モードごとに分離）
+        chat_history_by_mode = st.session_state.get(job_chat_key_base, {})
+        # 現在選択中のモードを取得（デフォルトはjob_understanding）
+        current_chat_mode = st.session_state.get(f"chat_mode_{id(result_dict)}", "job_understanding")
+        current_chat_history = chat_history_by_mode.get(current_chat_mode, [])
+        if current_chat_history:
+            mode_display_name = {
+                "job_understanding": "job_understanding",
+                "email_improvement": "email_improvement",
+                "interview_questions": "interview_questions"
+            }.get(current_chat_mode, "default")
+            chat_md = export_chat_to_md(current_chat_history, mode=mode_display_name)
+            st.download_button(
+                label="💬 チャット履歴をダウンロード (MD)",
+                data=chat_md.encode('utf-8'),
+                file_name=f"job_chat_{mode_display_name}.md",
+                mime="text/markdown",
+                key=f"{download_key_base}_chat"
+            )
+        else:
+            st.info("💡 チャット履歴があるとダウンロードできます")
+
+
+def _render_job_chat(result_dict: dict, job_chat_key_base: str):
+    """
+    求人深掘りチャットを表示（チャットを開いている場合のみ呼び出す）
+    
+    Args:
+        result_dict: 分析結果の辞書
+        job_chat_key_base: チャット履歴を保持するsession_stateのキー
+    """
+    if job_chat_key_base not in st.session_state:
+        st.session_state[job_chat_key_base] = {}
+    
     # モード選択
     chat_mode = st.radio(
         "チャットモードを選択",
@@ -1171,11 +1359,6 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
     }
     st.info(f"💡 **{mode_descriptions[chat_mode]}**")
     
-    # session_stateにチャット履歴を保持（結果ごとに独立、モードごとに分離）
-    job_chat_key_base = f"job_chat_history_{id(result_dict)}"
-    if job_chat_key_base not in st.session_state:
-        st.session_state[job_chat_key_base] = {}
-    
     # モードごとの履歴を取得
     chat_history_by_mode = st.session_state.get(job_chat_key_base, {})
     if chat_mode not in chat_history_by_mode:
@@ -1199,9 +1382,11 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
     }
     
     if prompt := st.chat_input(mode_placeholders[chat_mode]):
-        with st.spinner("考え中..."):
-            # チャット応答を生成
-            assistant_response = ask_job_chat(
+        st.markdown(f"**あなた**: {prompt}")
+        st.markdown("**アシスタント**:")
+        # チャット応答を生成（生成された順に表示し、最初の文字が出るまでの待ち時間だけで済むようにする）
+        assistant_response = st.write_stream(
+            stream_job_chat(
                 user_message=prompt,
                 job_text=result_dict.get('job_text', ''),
                 resume_text=result_dict.get('resume_text', ''),
@@ -1214,14 +1399,15 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
                 mode=chat_mode,
                 options=result_dict.get('options', {})
             )
-            
-            # チャット履歴に追加（モードごとに分離）
-            chat_history.append((prompt, assistant_response))
-            chat_history_by_mode[chat_mode] = chat_history
-            st.session_state[job_chat_key_base] = chat_history_by_mode
-            
-            # ページをリロードして履歴を表示
-            st.rerun()
+        )
+        
+        # チャット履歴に追加（モードごとに分離）
+        chat_history.append((prompt, assistant_response))
+        chat_history_by_mode[chat_mode] = chat_history
+        st.session_state[job_chat_key_base] = chat_history_by_mode
+        
+        # ページをリロードして履歴を表示
+        st.rerun()
     
     # 質問例を表示（モードごとに切り替え）
     with st.expander("💡 質問例", expanded=False):
@@ -1276,70 +1462,9 @@ def _render_single_result(result_dict: dict, resume_text: str, job_text: str = N
    - 「面接で質問すべき内容を教えてください」
    - 「この求人で確認すべき点を質問形式で教えてください」
             """)
-    
-    st.divider()
-    
-    # ダウンロードセクション
-    st.subheader("⬇️ ダウンロード")
-    st.markdown("**分析結果、応募メール下書き、チャット履歴をダウンロードできます**")
-    
-    # ダウンロード用のキー（結果ごとに独立）
-    download_key_base = f"download_{id(result_dict)}"
-    
-    # 1. 分析結果のダウンロード
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        analysis_md = export_analysis_to_md(result_dict)
-        st.download_button(
-            label="📄 分析結果をダウンロード (MD)",
-            data=analysis_md.encode('utf-8'),
-            file_name="analysis_result.md",
-            mime="text/markdown",
-            key=f"{download_key_base}_analysis"
-        )
-    
-    # 2. 応募メール下書きのダウンロード
-    with col2:
-        email_draft = st.session_state.get(email_draft_key)
-        if email_draft:
-            email_txt = export_email_to_txt(email_draft)
-            st.download_button(
-                label="📧 応募メール下書きをダウンロード (TXT)",
-                data=email_txt.encode('utf-8'),
-                file_name="email_draft.txt",
-                mime="text/plain",
-                key=f"{download_key_base}_email"
-            )
-        else:
-            st.info("💡 応募メール下書きを生成するとダウンロードできます")
-    
-    # 3. チャット履歴のダウンロード
-    with col3:
-        # チャット履歴を取得（モードごとに分離）
-        chat_history_by_mode = st.session_state.get(job_chat_key_base, {})
-        # 現在選択中のモードを取得（デフォルトはjob_understanding）
-        current_chat_mode = st.session_state.get(f"chat_mode_{id(result_dict)}", "job_understanding")
-        current_chat_history = chat_history_by_mode.get(current_chat_mode, [])
-        if current_chat_history:
-            mode_display_name = {
-                "job_understanding": "job_understanding",
-                "email_improvement": "email_improvement",
-                "interview_questions": "interview_questions"
-            }.get(current_chat_mode, "default")
-            chat_md = export_chat_to_md(current_chat_history, mode=mode_display_name)
-            st.download_button(
-                label="💬 チャット履歴をダウンロード (MD)",
-                data=chat_md.encode('utf-8'),
-                file_name=f"job_chat_{mode_display_name}.md",
-                mime="text/markdown",
-                key=f"{download_key_base}_chat"
-            )
-        else:
-            st.info("💡 チャット履歴があるとダウンロードできます")
 
 
-def _get_top_strengths(matched, top_n=3):
+def _get_top_strengths(matched: List[RequirementWithEvidence], top_n: int = 3) -> List[RequirementWithEvidence]:
     """
     強みTop3を抽出（confidence strong > partial、Must > Want を優先）
     
@@ -1357,19 +1482,19 @@ def _get_top_strengths(matched, top_n=3):
     # 1. confidenceが高い順（0.7以上=HIGH > 0.4-0.7=MEDIUM）
     # 2. Must優先（MUST=0, WANT=1）
     # 3. importance降順
-    sorted_matched = sorted(
+    # 上位N件のみ必要なため、全件ソートではなくヒープで抽出
+    return heapq.nsmallest(
+        top_n,
         matched,
         key=lambda m: (
             -m.evidence.confidence,  # confidence降順（負の値で大きい値が前に来る）
-            0 if m.requirement.category == RequirementType.MUST else 1,  # Must優先
+            CATEGORY_RANK.get(m.requirement.category, 1),  # Must優先
             -m.requirement.importance  # importance降順（負の値で大きい値が前に来る）
         )
     )
-    
-    return sorted_matched[:top_n]
 
 
-def _get_top_critical_gaps(gaps, top_n=3):
+def _get_top_critical_gaps(gaps: List[Gap], top_n: int = 3) -> List[Gap]:
     """
     致命的ギャップTop3を抽出（Must優先）
     
@@ -1386,15 +1511,15 @@ def _get_top_critical_gaps(gaps, top_n=3):
     # ソートキー：
     # 1. Must優先（MUST=0, WANT=1）
     # 2. importance降順
-    sorted_gaps = sorted(
+    # 上位N件のみ必要なため、全件ソートではなくヒープで抽出
+    return heapq.nsmallest(
+        top_n,
         gaps,
         key=lambda g: (
-            0 if g.requirement.category == RequirementType.MUST else 1,  # Must優先
+            CATEGORY_RANK.get(g.requirement.category, 1),  # Must優先
             -g.requirement.importance  # importance降順
         )
     )
-    
-    return sorted_gaps[:top_n]
 
 
 if __name__ == "__main__":
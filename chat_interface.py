@@ -2,20 +2,27 @@
 AI応募適合度チェッカー - チャット機能
 求人内容の深掘り考察、応募文面改善の提案
 """
-import os
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+from llm_client import get_chat_llm
+from utils import truncate_to_tokens
+
 # 環境変数読み込み
 load_dotenv()
 
+# コンテキストに含める各テキストのトークン数上限
+CONTEXT_TOKEN_BUDGETS = {
+    "job_text": 1200,
+    "resume_text": 1500,
+    "company_info": 800,
+}
 
-def get_chat_response(
+
+def _prepare_chat(
     user_message: str,
     job_text: str,
     resume_text: str,
@@ -23,9 +30,9 @@ def get_chat_response(
     analysis_result: Optional[Dict[str, Any]],
     chat_history: List[tuple],
     options: Optional[Dict[str, Any]] = None
-) -> str:
+) -> Tuple[Any, List[BaseMessage]]:
     """
-    チャット応答を生成
+    チャット応答用のLLMとメッセージを準備
     
     Args:
         user_message: ユーザーのメッセージ
@@ -39,7 +46,7 @@ def get_chat_response(
             - model_name: モデル名（デフォルト gpt-4o-mini）
     
     Returns:
-        str: アシスタントの応答
+        Tuple[Any, List[BaseMessage]]: (LLMインスタンス, LLMに渡すメッセージリスト)
     """
     # オプションのデフォルト値
     if options is None:
@@ -55,19 +62,8 @@ def get_chat_response(
         else:
             model_name = "gpt-4o-mini"
     
-    # LLMの初期化
-    if llm_provider == "anthropic":
-        llm = ChatAnthropic(
-            model=model_name,
-            temperature=0.7,
-            api_key=os.getenv("ANTHROPIC_API_KEY")
-        )
-    else:  # openai
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=0.7,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+    # LLMの取得（同じ設定のクライアントは再利用）
+    llm = get_chat_llm(llm_provider, model_name, 0.7)
     
     # システムプロンプト
     system_prompt = """あなたはAI応募適合度チェッカーのチャットアシスタントです。
@@ -93,16 +89,16 @@ def get_chat_response(
     
     # コンテキスト情報を準備
     context_info = f"""【求人票】
-{job_text[:1500] if len(job_text) > 1500 else job_text}
+{truncate_to_tokens(job_text, CONTEXT_TOKEN_BUDGETS["job_text"])}
 
 【職務経歴書】
-{resume_text[:1500] if len(resume_text) > 1500 else resume_text}
+{truncate_to_tokens(resume_text, CONTEXT_TOKEN_BUDGETS["resume_text"])}
 """
     
     if company_info and company_info.strip():
         context_info += f"""
 【企業情報】
-{company_info[:1000] if len(company_info) > 1000 else company_info}
+{truncate_to_tokens(company_info, CONTEXT_TOKEN_BUDGETS["company_info"])}
 """
     
     if analysis_result:
@@ -128,6 +124,39 @@ def get_chat_response(
     # 現在のユーザーメッセージを追加
     messages.append(HumanMessage(content=user_message))
     
+    return llm, messages
+
+
+def get_chat_response(
+    user_message: str,
+    job_text: str,
+    resume_text: str,
+    company_info: Optional[str],
+    analysis_result: Optional[Dict[str, Any]],
+    chat_history: List[tuple],
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    チャット応答を生成
+    
+    Args:
+        user_message: ユーザーのメッセージ
+        job_text: 求人票のテキスト
+        resume_text: 職務経歴書のテキスト
+        company_info: 企業情報（オプション）
+        analysis_result: 分析結果（オプション）
+        chat_history: チャット履歴 [(user, assistant), ...]
+        options: オプション辞書
+            - llm_provider: "openai" or "anthropic"（デフォルト "openai"）
+            - model_name: モデル名（デフォルト gpt-4o-mini）
+    
+    Returns:
+        str: アシスタントの応答
+    """
+    llm, messages = _prepare_chat(
+        user_message, job_text, resume_text, company_info, analysis_result, chat_history, options
+    )
+    
     # LLM実行
     try:
         response = llm.invoke(messages)
@@ -136,6 +165,45 @@ def get_chat_response(
         return f"エラーが発生しました: {str(e)}"
 
 
+def stream_chat_response(
+    user_message: str,
+    job_text: str,
+    resume_text: str,
+    company_info: Optional[str],
+    analysis_result: Optional[Dict[str, Any]],
+    chat_history: List[tuple],
+    options: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """
+    チャット応答を生成された順に少しずつ返す（st.write_stream用）
+    
+    Args:
+        user_message: ユーザーのメッセージ
+        job_text: 求人票のテキスト
+        resume_text: 職務経歴書のテキスト
+        company_info: 企業情報（オプション）
+        analysis_result: 分析結果（オプション）
+        chat_history: チャット履歴 [(user, assistant), ...]
+        options: オプション辞書
+            - llm_provider: "openai" or "anthropic"（デフォルト "openai"）
+            - model_name: モデル名（デフォルト gpt-4o-mini）
+    
+    Yields:
+        str: アシスタントの応答の断片
+    """
+    llm, messages = _prepare_chat(
+        user_message, job_text, resume_text, company_info, analysis_result, chat_history, options
+    )
+    
+    # LLM実行（ストリーミング）
+    try:
+        for chunk in llm.stream(messages):
+            if isinstance(chunk.content, str) and chunk.content:
+                yield chunk.content
+    except Exception as e:
+        yield f"エラーが発生しました: {str(e)}"
+
+
 
 
 
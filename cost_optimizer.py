@@ -3,10 +3,20 @@ AI応募適合度チェッカー - コスト最適化
 プロンプト圧縮、キャッシュ管理
 """
 import hashlib
+import json
 from typing import List, Tuple
 import re
 
 
+# 重複判定用：空白（全角含む）の連続、行頭の箇条書き記号、文末の句点
+_WHITESPACE_PATTERN = re.compile(r'[\s　]+')
+_BULLET_PREFIX_PATTERN = re.compile(r'^[・\-*•●■◆□◇※>]+')
+_SENTENCE_END_PATTERN = re.compile(r'[。．.]+$')
+
+# 文分割用：文末記号（。！？）までの文、または改行までの文末記号のない文
+_SENTENCE_PATTERN = re.compile(r'[^。！？\n]*[。！？]|[^。！？\n]+')
+
+
 def compress_text(text: str, max_length: int = 200) -> str:
     """
     テキストを圧縮（長い場合は先頭末尾の要点を残す）
@@ -38,7 +48,7 @@ def limit_candidate_sentences(
     max_length_per_sentence: int = 200
 ) -> List[str]:
     """
-    候補文を上限N件に絞り、長い文は圧縮
+    候補文の重複を除き、上限N件に絞り、長い文は圧縮
     
     Args:
         sentences: 候補文のリスト
@@ -46,14 +56,17 @@ def limit_candidate_sentences(
         max_length_per_sentence: 1文あたりの最大文字数
     
     Returns:
-        List[str]: 絞り込まれた候補文リスト
+        List[str]: 絞り込まれた候補文リスト（元の順序を維持）
     """
     if not sentences:
         return []
     
+    # 重複文を除去（複数の職歴に同じ箇条書きがある場合など、LLMへの入力トークンを削減）
+    unique_sentences = _deduplicate_sentences(sentences)
+    
     # 長い文を圧縮
     compressed_sentences = [
-        compress_text(s, max_length_per_sentence) for s in sentences
+        compress_text(s, max_length_per_sentence) for s in unique_sentences
     ]
     
     # 上限件数に絞る
@@ -64,6 +77,29 @@ def limit_candidate_sentences(
     return compressed_sentences
 
 
+def _deduplicate_sentences(sentences: List[str]) -> List[str]:
+    """
+    重複文を除去（空白・箇条書き記号・文末の句点の違いは同一とみなす）
+    
+    Args:
+        sentences: 候補文のリスト
+    
+    Returns:
+        List[str]: 重複を除いた候補文リスト（最初に出現したものを元の順序で残す）
+    """
+    seen = set()
+    unique_sentences = []
+    for sentence in sentences:
+        key = _WHITESPACE_PATTERN.sub(' ', sentence).strip()
+        key = _BULLET_PREFIX_PATTERN.sub('', key).strip()
+        key = _SENTENCE_END_PATTERN.sub('', key)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        unique_sentences.append(sentence)
+    return unique_sentences
+
+
 def get_cache_key(
     job_text: str,
     resume_text: str,
@@ -82,24 +118,32 @@ def get_cache_key(
     Returns:
         str: キャッシュキー（ハッシュ値）
     """
-    # キャッシュキーに含める情報を文字列化
-    cache_data = {
-        "job_text": job_text.strip() if job_text else "",
-        "resume_text": resume_text.strip() if resume_text else "",
-        "achievement_notes": achievement_notes.strip() if achievement_notes else "",
-        "options": {
-            "max_must": options.get("max_must", 10) if options else 10,
-            "max_want": options.get("max_want", 10) if options else 10,
-            "strict_mode": options.get("strict_mode", False) if options else False,
-            "model_name": options.get("model_name", None) if options else None,
-        }
+    # テキスト項目（前後の空白は無視）
+    text_fields = [
+        job_text.strip() if job_text else "",
+        resume_text.strip() if resume_text else "",
+        achievement_notes.strip() if achievement_notes else "",
+    ]
+    
+    # キャッシュキーに影響するオプション
+    key_options = {
+        "max_must": options.get("max_must", 10) if options else 10,
+        "max_want": options.get("max_want", 10) if options else 10,
+        "strict_mode": options.get("strict_mode", False) if options else False,
+        "model_name": options.get("model_name", None) if options else None,
     }
     
-    # 辞書をソートして文字列化（順序を固定）
-    cache_str = str(sorted(cache_data.items()))
+    # BLAKE2bハッシュを生成（標準ライブラリで利用でき、SHA256より高速）
+    hash_obj = hashlib.blake2b(digest_size=32)
+    
+    # 各テキストの前にバイト長を付けて連結（項目の境界がずれて別の入力と同じキーになるのを防ぐ）
+    for text in text_fields:
+        text_bytes = text.encode('utf-8')
+        hash_obj.update(len(text_bytes).to_bytes(8, 'little'))
+        hash_obj.update(text_bytes)
     
-    # SHA256ハッシュを生成
-    hash_obj = hashlib.sha256(cache_str.encode('utf-8'))
+    # オプションはキー順を固定したJSONで文字列化（reprに依存しない安定した表現）
+    hash_obj.update(json.dumps(key_options, ensure_ascii=False, sort_keys=True).encode('utf-8'))
     return hash_obj.hexdigest()
 
 
@@ -141,32 +185,12 @@ def split_into_sentences(text: str) -> List[str]:
     if not text:
         return []
     
-    # 改行で分割
-    lines = text.split('\n')
-    
-    # 各ラインをさらに文単位で分割（。！？で区切る）
+    # 改行または文末記号（。！？）で区切り、1回の走査で文を取り出す（文末記号は文に含める）
     sentences = []
-    for line in lines:
-        if not line.strip():
-            continue
-        
-        # 文末記号で分割
-        line_sentences = re.split(r'([。！？])', line)
-        
-        # 文末記号を含めて結合
-        current_sentence = ""
-        for i, part in enumerate(line_sentences):
-            if part in ['。', '！', '？']:
-                current_sentence += part
-                if current_sentence.strip():
-                    sentences.append(current_sentence.strip())
-                current_sentence = ""
-            else:
-                current_sentence += part
-        
-        # 残りの部分
-        if current_sentence.strip():
-            sentences.append(current_sentence.strip())
+    for match in _SENTENCE_PATTERN.finditer(text):
+        sentence = match.group().strip()
+        if sentence:
+            sentences.append(sentence)
     
     return sentences
 
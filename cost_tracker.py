@@ -2,9 +2,12 @@
 コスト追跡機能
 LLM呼び出しのtoken数とコストを概算で表示
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
+from types import MappingProxyType
+
+from utils import encode_tokens
 
 
 @dataclass
@@ -46,10 +49,20 @@ PRICING = {
     }
 }
 
+# 1トークンあたりの単価 (provider, model_name) -> (入力, 出力)。計算のたびに割り算しないよう事前計算
+_COST_PER_TOKEN = MappingProxyType({
+    (provider, model_name): (prices["input"] / 1000, prices["output"] / 1000)
+    for provider, models in PRICING.items()
+    for model_name, prices in models.items()
+})
+_DEFAULT_COST_PER_TOKEN = _COST_PER_TOKEN[("openai", "gpt-4o-mini")]
+
 
 def estimate_tokens(text: str) -> int:
     """
-    テキストのトークン数を概算（簡易版：文字数ベース）
+    テキストのトークン数を概算（トークナイザーで計数、利用できない場合は文字数ベース）
+    
+    Anthropicのモデルも同じトークナイザーで近似する（モデル間の差は文字数ベースの誤差より小さい）。
     
     Args:
         text: テキスト
@@ -57,10 +70,15 @@ def estimate_tokens(text: str) -> int:
     Returns:
         int: 概算トークン数
     """
-    # 簡易的な概算: 日本語は約2文字=1トークン、英語は約4文字=1トークン
-    # 混合テキストを考慮して、平均3文字=1トークンとして概算
     if not text:
         return 0
+    
+    tokens = encode_tokens(text)
+    if tokens is not None:
+        return len(tokens)
+    
+    # 簡易的な概算: 日本語は約2文字=1トークン、英語は約4文字=1トークン
+    # 混合テキストを考慮して、平均3文字=1トークンとして概算
     return len(text) // 3
 
 
@@ -86,13 +104,13 @@ def calculate_cost(
     input_tokens = estimate_tokens(input_text)
     output_tokens = estimate_tokens(output_text)
     
-    # 価格を取得（デフォルトはgpt-4o-mini相当）
-    pricing = PRICING.get(provider, {}).get(model_name, PRICING["openai"]["gpt-4o-mini"])
+    # 1トークンあたりの単価を取得（デフォルトはgpt-4o-mini相当）
+    input_cost_per_token, output_cost_per_token = _COST_PER_TOKEN.get(
+        (provider, model_name), _DEFAULT_COST_PER_TOKEN
+    )
     
     # コストを計算
-    input_cost = (input_tokens / 1000) * pricing["input"]
-    output_cost = (output_tokens / 1000) * pricing["output"]
-    total_cost = input_cost + output_cost
+    total_cost = input_tokens * input_cost_per_token + output_tokens * output_cost_per_token
     
     return CostInfo(
         provider=provider,
@@ -125,14 +143,25 @@ class CostTracker:
     
     def __init__(self):
         self.costs: list[CostInfo] = []
+        # 合計は追加時に加算しておく（取得のたびに全件を足し直さない）
+        self._total_cost_usd = 0.0
+        self._total_input_tokens = 0
+        self._total_output_tokens = 0
     
     def add_cost(self, cost_info: CostInfo):
         """コスト情報を追加"""
         self.costs.append(cost_info)
+        self._total_cost_usd += cost_info.estimated_cost_usd
+        self._total_input_tokens += cost_info.input_tokens
+        self._total_output_tokens += cost_info.output_tokens
     
     def get_total_cost(self) -> float:
         """合計コストを取得"""
-        return sum(cost.estimated_cost_usd for cost in self.costs)
+        return self._total_cost_usd
+    
+    def get_total_tokens(self) -> Tuple[int, int]:
+        """合計トークン数を取得（入力, 出力）"""
+        return self._total_input_tokens, self._total_output_tokens
     
     def get_summary(self) -> str:
         """コストサマリを取得"""
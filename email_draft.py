@@ -2,12 +2,13 @@
 応募メール下書き生成
 求人票、企業情報、職務経歴書、分析結果から応募メール下書きを生成
 """
+import io
 import os
-from typing import List, Optional, Dict, Any
+import re
+from typing import List, Optional, Dict, Any, Callable
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
@@ -18,8 +19,12 @@ from models import (
     Gap,
     Improvements,
     EmailDraft,
-    EmailEvidence
+    EmailEvidence,
+    RequirementType
 )
+from llm_cache import make_cache_key, get_cached_response, store_response
+from llm_client import get_chat_llm
+from utils import normalize_text, truncate_to_tokens
 
 # 環境変数読み込み
 load_dotenv()
@@ -53,6 +58,133 @@ class EmailDraftOutput(BaseModel):
     email_draft: EmailDraft = Field(..., description="応募メール下書き")
 
 
+# ==================== プロンプト ====================
+# 全ての応募で共通の指示（プロンプトの先頭に固定で置き、プロバイダーのプロンプトキャッシュを効かせる）
+EMAIL_DRAFT_INSTRUCTIONS = """あなたは応募メール下書き作成の専門家です。ユーザーから渡される情報から、効果的な応募メール下書きを生成してください。
+
+応募メール下書きの要件：
+
+1. **件名案（2〜3件）**
+   - 簡潔で目を引く件名（30文字以内推奨）
+   - 応募職種や志望動機が分かる内容
+
+2. **本文テンプレート**
+   - 丁寧で短め（300-500文字程度）
+   - 冒頭: 宛名（宛名情報を使用）+ 応募の動機・志望動機（企業情報がある場合は企業文化に合わせる）
+   - 中盤: 職務経歴の要点と求人要件との適合点を簡潔に
+   - 終盤: 今後の意欲・連絡先の案内
+
+3. **根拠リスト（evidence_list）**
+   - 本文中の各主張に対して、どの実績・どの要件に紐づくかを明記
+   - evidence_type: "requirement"（要件に紐づく）、"resume"（職務経歴書に記載）、"achievement"（実績）
+   - evidence_text: 引用または箇条書きで根拠を提示
+   - requirement_id: 対応する要件ID（該当する場合）
+
+4. **注意事項（notes）**
+   - 捏造禁止: 職務経歴にないことを断定しない
+   - 未経験の表現: 「学習中」「経験を活かして挑戦」「計画中」など現実的な表現
+   - 送信前の確認事項
+
+宛名のルール：
+- 宛名情報を本文の冒頭に自然に反映してください
+- 会社名・担当者名が未入力の場合は「採用ご担当者様」「貴社」を使用してください
+- 入力があるときだけ固有名詞として使用し、捏造で勝手に部署名等を追加しないでください
+
+重要ルール：
+- 職務経歴にないことを断定しない（「学習中」「計画中」など現実的な表現）
+- 企業情報がある場合は、企業文化や価値観に合わせた文面にする
+- 簡潔で読みやすい文面
+- 丁寧で誠実なトーン
+- 根拠は必ず職務経歴書または分析結果に基づく
+- 宛名は入力された情報のみを使用し、捏造で勝手に部署名等を追加しない
+"""
+
+# 応募ごとに変わる情報
+EMAIL_DRAFT_INPUT_TEMPLATE = """以下の情報から応募メール下書きを生成してください。
+
+【求人票（抜粋）】
+{job_text}
+
+【企業情報】
+{company_info}
+
+【職務経歴書（抜粋）】
+{resume_text}
+
+【マッチした要件（強み）】
+{matched_summary}
+
+【マッチした要件の根拠（引用）】
+{matched_evidence_str}
+
+【改善案の方向性】
+{improvements_str}
+
+【宛名情報】
+{greeting}
+- 会社名: {company_name_info}
+- 担当者名: {contact_person_info}
+"""
+
+# プロンプトに含める各入力の最大トークン数（日本語と英語で文字数あたりのトークン数が異なるためトークンで管理）
+CONTEXT_TOKEN_BUDGETS = {
+    "job_text": 1500,
+    "resume_text": 1500,
+    "company_info": 800,
+}
+
+# 求人票・職務経歴書がともにこの文字数未満の場合はLLMを使わずテンプレートで作成
+MIN_LLM_INPUT_CHARS = 200
+
+# 壊れたJSON応答の修正（下書き全体を再生成せず、短い応答だけを直す）
+EMAIL_DRAFT_FIX_TEMPLATE = """以下の出力は指定の形式を満たしておらず、パースに失敗しました。
+内容は変えずに、形式だけを修正したJSONを出力してください。
+
+【形式】
+{format_instructions}
+
+【元の出力】
+{output}
+
+【エラー】
+{error}
+"""
+
+# ストリーミング中の応答（JSON）から本文フィールドの開始位置を探す
+_BODY_FIELD_PATTERN = re.compile(r'"body"\s*:\s*"')
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+# パーサーとプロンプトは入力に依存しないため、モジュール読み込み時に一度だけ構築する
+_PARSER = PydanticOutputParser(pydantic_object=EmailDraftOutput)
+_FORMAT_INSTRUCTIONS = _PARSER.get_format_instructions()
+# プロンプト作成（固定の指示はシステムメッセージ、入力ごとに変わる情報はユーザーメッセージ）
+_SYSTEM_TEXT = f"{EMAIL_DRAFT_INSTRUCTIONS}\n{_FORMAT_INSTRUCTIONS}\n"
+_PROMPT_TEMPLATE = PromptTemplate(
+    template=EMAIL_DRAFT_INPUT_TEMPLATE,
+    input_variables=["job_text", "company_info", "resume_text", "matched_summary", "matched_evidence_str", "improvements_str", "greeting", "company_name_info", "contact_person_info"]
+)
+
+
+def _build_system_message(system_text: str, llm_provider: str) -> SystemMessage:
+    """
+    固定の指示をシステムメッセージにする（Anthropicはキャッシュ対象として明示）
+    
+    OpenAIは一定長以上の共通プレフィックスを自動でキャッシュするため、指示を先頭に置くだけでよい。
+    
+    Args:
+        system_text: 固定の指示テキスト
+        llm_provider: "openai" or "anthropic"
+    
+    Returns:
+        SystemMessage: システムメッセージ
+    """
+    if llm_provider == "anthropic":
+        return SystemMessage(content=[
+            {"type": "text", "text": system_text, "cache_control": {"type": "ephemeral"}}
+        ])
+    return SystemMessage(content=system_text)
+
+
 def generate_email_draft(
     job_text: str,
     resume_text: str,
@@ -81,6 +213,8 @@ def generate_email_draft(
         options: オプション辞書
             - llm_provider: "openai" or "anthropic"（デフォルト "openai"）
             - model_name: モデル名（デフォルト gpt-4o-mini）
+            - on_token: 生成中のテキスト片を受け取るコールバック（指定時は初回の呼び出しをストリーミング）
+            - force_llm: Trueの場合、入力が乏しくてもテンプレートを使わずLLMで生成する
     
     Returns:
         EmailDraft: 応募メール下書き
@@ -88,9 +222,20 @@ def generate_email_draft(
     # オプションのデフォルト値
     if options is None:
         options = {}
-    
+
+    # 入力準備はfallbackの対象外のため、欠けている入力はここで空値に揃える
+    job_text = job_text or ""
+    resume_text = resume_text or ""
+    requirements = requirements or []
+    matched = matched or []
+
     llm_provider = options.get("llm_provider", "openai")
     model_name = options.get("model_name", None)
+    on_token = options.get("on_token")
+    
+    # 根拠にできる材料が無い場合はLLMを呼ばずにテンプレートで作成（LLMでも引用できる実績が無く、ほぼ同じ文面になるため）
+    if not options.get("force_llm", False) and lacks_draft_material(job_text, resume_text, requirements, matched):
+        return _fallback_generate_draft(job_text, resume_text, matched, company_name, contact_person)
     
     # コスト重視のため、miniモデルをデフォルトに
     if not model_name:
@@ -99,148 +244,98 @@ def generate_email_draft(
         else:
             model_name = "gpt-4o-mini"
     
-    # LLMの初期化
-    try:
-        if llm_provider == "anthropic":
-            llm = ChatAnthropic(
-                model=model_name,
-                temperature=0.7,  # 文面生成なので創造性を少し高める
-                api_key=os.getenv("ANTHROPIC_API_KEY")
-            )
-        else:  # openai
-            llm = ChatOpenAI(
-                model=model_name,
-                temperature=0.7,
-                api_key=os.getenv("OPENAI_API_KEY")
-            )
-        
-        # パーサー設定
-        parser = PydanticOutputParser(pydantic_object=EmailDraftOutput)
-        
-        # 分析結果を準備
-        matched_summary = "\n".join([
-            f"- [{m.requirement.req_id}] {m.requirement.description} (一致度: {m.evidence.confidence:.0%})"
-            for m in matched[:5]
-        ]) if matched else "マッチした要件なし"
-        
-        # マッチした要件の根拠（引用）を準備
-        matched_evidence = []
-        for m in matched[:3]:  # 上位3件
-            if m.evidence.quotes:
-                quotes_text = "\n".join([f"  - {q.text[:100]}..." for q in m.evidence.quotes[:2]])
-                matched_evidence.append(f"[{m.requirement.req_id}] {m.requirement.description}\n根拠:\n{quotes_text}")
-        
-        matched_evidence_str = "\n\n".join(matched_evidence) if matched_evidence else "根拠なし"
-        
-        company_info_str = company_text if company_text and company_text.strip() else "企業情報なし"
-        
-        # 宛名情報を準備
-        if company_name and company_name.strip():
-            if contact_person and contact_person.strip():
-                greeting = f"{company_name} {contact_person}様"
-            else:
-                greeting = f"{company_name} 採用ご担当者様"
+    # APIキーが無い場合はLLMを呼ばずにテンプレートで作成
+    api_key_env = "ANTHROPIC_API_KEY" if llm_provider == "anthropic" else "OPENAI_API_KEY"
+    if not os.getenv(api_key_env):
+        print(f"⚠️  {api_key_env}が未設定のため、応募メール下書きはfallbackを使用")
+        return _fallback_generate_draft(job_text, resume_text, matched, company_name, contact_person)
+    
+    # 分析結果を準備
+    matched_summary = "\n".join([
+        f"- [{req.req_id}] {req.description} (一致度: {ev.confidence:.0%})"
+        for req, ev in ((m.requirement, m.evidence) for m in matched[:5])
+    ]) if matched else "マッチした要件なし"
+    
+    # マッチした要件の根拠（引用）を準備
+    evidence_buffer = io.StringIO()
+    for m in matched[:3]:  # 上位3件
+        quotes = m.evidence.quotes
+        if not quotes:
+            continue
+        req = m.requirement
+        if evidence_buffer.tell():
+            evidence_buffer.write("\n\n")
+        evidence_buffer.write(f"[{req.req_id}] {req.description}\n根拠:")
+        for q in quotes[:2]:
+            evidence_buffer.write(f"\n  - {q.text[:100]}...")
+    
+    matched_evidence_str = evidence_buffer.getvalue() or "根拠なし"
+    
+    company_info_str = company_text if company_text and company_text.strip() else "企業情報なし"
+    
+    # 宛名情報を準備
+    if company_name and company_name.strip():
+        if contact_person and contact_person.strip():
+            greeting = f"{company_name} {contact_person}様"
         else:
-            if contact_person and contact_person.strip():
-                greeting = f"{contact_person}様"
-            else:
-                greeting = "採用ご担当者様"
-        
-        # プロンプト作成
-        prompt_template = PromptTemplate(
-            template="""あなたは応募メール下書き作成の専門家です。以下の情報から、効果的な応募メール下書きを生成してください。
-
-【求人票（抜粋）】
-{job_text}
-
-【企業情報】
-{company_info}
-
-【職務経歴書（抜粋）】
-{resume_text}
-
-【マッチした要件（強み）】
-{matched_summary}
-
-【マッチした要件の根拠（引用）】
-{matched_evidence_str}
-
-【改善案の方向性】
-{improvements_str}
-
-【宛名情報】
-{greeting}
-- 会社名: {company_name_info}
-- 担当者名: {contact_person_info}
-- 上記の宛名情報を本文の冒頭に自然に反映してください
-- 会社名・担当者名が未入力の場合は「採用ご担当者様」「貴社」を使用してください
-- 入力があるときだけ固有名詞として使用し、捏造で勝手に部署名等を追加しないでください
-
-応募メール下書きの要件：
-
-1. **件名案（2〜3件）**
-   - 簡潔で目を引く件名（30文字以内推奨）
-   - 応募職種や志望動機が分かる内容
-
-2. **本文テンプレート**
-   - 丁寧で短め（300-500文字程度）
-   - 冒頭: 宛名（上記の宛名情報を使用）+ 応募の動機・志望動機（企業情報がある場合は企業文化に合わせる）
-   - 中盤: 職務経歴の要点と求人要件との適合点を簡潔に
-   - 終盤: 今後の意欲・連絡先の案内
-
-3. **根拠リスト（evidence_list）**
-   - 本文中の各主張に対して、どの実績・どの要件に紐づくかを明記
-   - evidence_type: "requirement"（要件に紐づく）、"resume"（職務経歴書に記載）、"achievement"（実績）
-   - evidence_text: 引用または箇条書きで根拠を提示
-   - requirement_id: 対応する要件ID（該当する場合）
-
-4. **注意事項（notes）**
-   - 捏造禁止: 職務経歴にないことを断定しない
-   - 未経験の表現: 「学習中」「経験を活かして挑戦」「計画中」など現実的な表現
-   - 送信前の確認事項
-
-重要ルール：
-- 職務経歴にないことを断定しない（「学習中」「計画中」など現実的な表現）
-- 企業情報がある場合は、企業文化や価値観に合わせた文面にする
-- 簡潔で読みやすい文面
-- 丁寧で誠実なトーン
-- 根拠は必ず職務経歴書または分析結果に基づく
-- 宛名は入力された情報のみを使用し、捏造で勝手に部署名等を追加しない
-
-{format_instructions}
-""",
-            input_variables=["job_text", "company_info", "resume_text", "matched_summary", "matched_evidence_str", "improvements_str", "greeting", "company_name_info", "contact_person_info"],
-            partial_variables={"format_instructions": parser.get_format_instructions()}
-        )
-        
-        # テキストをカット（長すぎる場合）
-        job_text_trimmed = job_text[:2000] + "..." if len(job_text) > 2000 else job_text
-        resume_text_trimmed = resume_text[:2000] + "..." if len(resume_text) > 2000 else resume_text
-        company_info_trimmed = company_info_str[:1000] + "..." if len(company_info_str) > 1000 else company_info_str
-        
-        improvements_str = improvements.overall_strategy[:500] if improvements.overall_strategy else "改善案なし"
+            greeting = f"{company_name} 採用ご担当者様"
+    else:
+        if contact_person and contact_person.strip():
+            greeting = f"{contact_person}様"
+        else:
+            greeting = "採用ご担当者様"
+    
+    # テキストをカット（長すぎる場合）
+    job_text_trimmed = truncate_to_tokens(job_text, CONTEXT_TOKEN_BUDGETS["job_text"], suffix="...")
+    resume_text_trimmed = truncate_to_tokens(resume_text, CONTEXT_TOKEN_BUDGETS["resume_text"], suffix="...")
+    company_info_trimmed = truncate_to_tokens(company_info_str, CONTEXT_TOKEN_BUDGETS["company_info"], suffix="...")
+    
+    improvements_str = improvements.overall_strategy[:500] if improvements and improvements.overall_strategy else "改善案なし"
+    
+    # 宛名情報の説明
+    company_name_info = company_name if company_name and company_name.strip() else "未入力（「貴社」を使用）"
+    contact_person_info = contact_person if contact_person and contact_person.strip() else "未入力（「採用ご担当者様」を使用）"
+    
+    prompt = _PROMPT_TEMPLATE.format(
+        job_text=job_text_trimmed,
+        company_info=company_info_trimmed,
+        resume_text=resume_text_trimmed,
+        matched_summary=matched_summary,
+        matched_evidence_str=matched_evidence_str,
+        improvements_str=improvements_str,
+        greeting=greeting,
+        company_name_info=company_name_info,
+        contact_person_info=contact_person_info
+    )
+    messages = [_build_system_message(_SYSTEM_TEXT, llm_provider), HumanMessage(content=prompt)]
+    # 改行・空白の違いだけの入力は同じ下書きを再利用する
+    cache_key = make_cache_key("email_draft", _SYSTEM_TEXT + normalize_text(prompt), llm_provider, model_name, 0.7)
+    
+    # LLM呼び出し（API・応答形式の失敗のみfallbackに回し、入力準備の不具合は隠さない）
+    try:
+        llm = get_chat_llm(llm_provider, model_name, 0.7)  # 文面生成なので創造性を少し高める
         
-        # 宛名情報の説明
-        company_name_info = company_name if company_name and company_name.strip() else "未入力（「貴社」を使用）"
-        contact_person_info = contact_person if contact_person and contact_person.strip() else "未入力（「採用ご担当者様」を使用）"
+        # 形式修正用（内容を変えないよう温度0）
+        fix_llm = get_chat_llm(llm_provider, model_name, 0.0)
         
         # LLM実行とパース（最大3回リトライ）
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                prompt = prompt_template.format(
-                    job_text=job_text_trimmed,
-                    company_info=company_info_trimmed,
-                    resume_text=resume_text_trimmed,
-                    matched_summary=matched_summary,
-                    matched_evidence_str=matched_evidence_str,
-                    improvements_str=improvements_str,
-                    greeting=greeting,
-                    company_name_info=company_name_info,
-                    contact_person_info=contact_person_info
-                )
-                output = llm.invoke(prompt)
-                result = parser.parse(output.content)
+                content = get_cached_response(cache_key)
+                if content is None:
+                    if on_token is not None and attempt == 0:
+                        content = _stream_content(llm, messages, on_token)
+                    else:
+                        # リトライ時は途中経過を表示し直さないよう一括で取得
+                        content = llm.invoke(messages).content
+                try:
+                    result = _PARSER.parse(content)
+                except Exception as parse_error:
+                    # 形式の崩れだけなら修正で済ませ、失敗した場合のみ再生成する
+                    content = _fix_output(fix_llm, content, parse_error)
+                    result = _PARSER.parse(content)
+                store_response(cache_key, content)
                 email_draft = result.email_draft
                 break
             except Exception as parse_error:
@@ -257,6 +352,114 @@ def generate_email_draft(
     return email_draft
 
 
+def lacks_draft_material(
+    job_text: str,
+    resume_text: str,
+    requirements: List[Requirement],
+    matched: List[RequirementWithEvidence]
+) -> bool:
+    """
+    LLMで下書きを作る材料が無いかを判定する（UIでテンプレート作成になることを事前に案内するためにも使用）
+
+    Args:
+        job_text: 求人票のテキスト
+        resume_text: 職務経歴書のテキスト
+        requirements: 全要件リスト
+        matched: マッチした要件と根拠のペア
+
+    Returns:
+        bool: Must要件があるのに1件もマッチしていない、または入力が極端に短い場合True
+    """
+    if not matched and any(r.category == RequirementType.MUST for r in requirements):
+        return True
+    return len(job_text or "") < MIN_LLM_INPUT_CHARS and len(resume_text or "") < MIN_LLM_INPUT_CHARS
+
+
+def extract_streaming_body(partial_output: str) -> Optional[str]:
+    """
+    生成途中の応答（JSON）から本文（body）のここまでの内容を取り出す（ストリーミング表示用）
+
+    Args:
+        partial_output: ここまでに受け取った応答テキスト
+
+    Returns:
+        Optional[str]: 本文のここまでの内容。本文フィールドがまだ出力されていない場合はNone
+    """
+    match = _BODY_FIELD_PATTERN.search(partial_output)
+    if match is None:
+        return None
+
+    chars = []
+    i = match.end()
+    end = len(partial_output)
+    while i < end:
+        char = partial_output[i]
+        if char == '"':
+            break
+        if char != "\\":
+            chars.append(char)
+            i += 1
+            continue
+        # エスケープが途中で切れている場合は次のテキスト片を待つ
+        if i + 1 >= end:
+            break
+        escaped = partial_output[i + 1]
+        if escaped == "u":
+            hex_digits = partial_output[i + 2:i + 6]
+            if len(hex_digits) < 4:
+                break
+            try:
+                chars.append(chr(int(hex_digits, 16)))
+            except ValueError:
+                break
+            i += 6
+            continue
+        chars.append(_JSON_ESCAPES.get(escaped, escaped))
+        i += 2
+    return "".join(chars)
+
+
+def _stream_content(llm, messages: List[Any], on_token: Callable[[str], None]) -> str:
+    """
+    LLMの応答をストリーミングで受け取り、テキスト片ごとにコールバックを呼ぶ
+
+    Args:
+        llm: LangChainのチャットモデル
+        messages: 入力メッセージ
+        on_token: テキスト片を受け取るコールバック
+
+    Returns:
+        str: 連結した応答テキスト
+    """
+    chunks = []
+    for chunk in llm.stream(messages):
+        # Anthropicのコンテンツブロック（リスト形式）のチャンクは連結できないため、文字列のみ扱う
+        if isinstance(chunk.content, str) and chunk.content:
+            chunks.append(chunk.content)
+            on_token(chunk.content)
+    return "".join(chunks)
+
+
+def _fix_output(fix_llm, output: str, error: Exception) -> str:
+    """
+    パースに失敗した応答の形式をLLMで修正する
+
+    Args:
+        fix_llm: 修正に使うLangChainのチャットモデル
+        output: パースに失敗した応答テキスト
+        error: パース時の例外
+
+    Returns:
+        str: 修正後の応答テキスト
+    """
+    prompt = EMAIL_DRAFT_FIX_TEMPLATE.format(
+        format_instructions=_FORMAT_INSTRUCTIONS,
+        output=output,
+        error=str(error)[:500]
+    )
+    return fix_llm.invoke(prompt).content
+
+
 def _fallback_generate_draft(
     job_text: str,
     resume_text: str,
@@ -319,13 +522,16 @@ def _fallback_generate_draft(
     
     evidence_list = []
     for m in matched[:2]:
-        if m.evidence.quotes:
-            quote_text = m.evidence.quotes[0].text[:100] + "..." if len(m.evidence.quotes[0].text) > 100 else m.evidence.quotes[0].text
+        quotes = m.evidence.quotes
+        if quotes:
+            req = m.requirement
+            first_quote = quotes[0].text
+            quote_text = first_quote[:100] + "..." if len(first_quote) > 100 else first_quote
             evidence_list.append(EmailEvidence(
-                claim=f"{m.requirement.description}の経験",
+                claim=f"{req.description}の経験",
                 evidence_type="requirement",
                 evidence_text=quote_text,
-                requirement_id=m.requirement.req_id
+                requirement_id=req.req_id
             ))
     
     notes = [
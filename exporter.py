@@ -2,7 +2,8 @@
 分析結果・応募メール下書き・チャット履歴のエクスポート機能
 Markdown / テキスト形式でダウンロード可能にする
 """
-from typing import List, Dict, Any, Optional
+import io
+from typing import List, Dict, Any, Optional, TextIO
 from datetime import datetime
 
 from models import (
@@ -11,7 +12,8 @@ from models import (
     Gap,
     Improvements,
     EmailDraft,
-    RequirementType
+    RequirementType,
+    QuoteSource
 )
 
 
@@ -21,10 +23,34 @@ PERSONAL_INFO_WARNING = """⚠️ **個人情報に関する注意**
 個人情報や機密情報が含まれていないか確認し、適切に管理してください。
 """
 
+# テキスト形式の区切り線
+_TXT_HEAVY_RULE = "=" * 60 + "\n"
+_TXT_RULE = "-" * 60 + "\n"
 
-def export_analysis_to_md(result_dict: Dict[str, Any]) -> str:
+# テキスト形式用の注意書き（Markdown記法と絵文字の異体字セレクタを除去）
+_PERSONAL_INFO_WARNING_TXT = PERSONAL_INFO_WARNING.replace("**", "").replace("⚠️", "⚠")
+
+# 引用の出どころの表示名
+_QUOTE_SOURCE_LABELS = {QuoteSource.RESUME: "職務経歴書", QuoteSource.RAG: "実績DB"}
+
+# 職務経歴書の編集種別の表示名
+_EDIT_TYPE_LABELS = {"add": "追記", "emphasize": "強調", "rewrite": "書き換え"}
+
+# チャット履歴の1会話分
+_CHAT_ENTRY_TEMPLATE = "## 会話 {i}\n\n### あなた\n\n{user}\n\n### アシスタント\n\n{assistant}\n\n---\n"
+
+# チャットモードの表示名
+_MODE_DISPLAY_NAMES = {
+    "job_understanding": "📖 求人理解",
+    "email_improvement": "📧 応募メール改善",
+    "interview_questions": "❓ 面接質問作成",
+    "default": "チャット"
+}
+
+
+def write_analysis_md(result_dict: Dict[str, Any], fp: TextIO):
     """
-    分析結果をMarkdown形式でエクスポート
+    分析結果をMarkdown形式で書き出す
     
     Args:
         result_dict: 分析結果の辞書
@@ -36,349 +62,313 @@ def export_analysis_to_md(result_dict: Dict[str, Any]) -> str:
             - requirements (List[Requirement])
             - timestamp (str)
             - execution_time (float)
-    
-    Returns:
-        str: Markdown形式の文字列
+        fp: 書き込み先（ファイルやio.StringIOなど、テキストを書き込めるオブジェクト）
     """
-    lines = []
-    
     # ヘッダー
-    lines.append("# AI応募適合度チェッカー - 分析結果")
-    lines.append("")
-    lines.append(f"**生成日時**: {result_dict.get('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}")
+    fp.write("# AI応募適合度チェッカー - 分析結果\n\n")
+    fp.write(f"**生成日時**: {result_dict.get('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}\n")
     if result_dict.get('execution_time'):
-        lines.append(f"**実行時間**: {result_dict.get('execution_time', 0):.2f}秒")
-    lines.append("")
-    lines.append("---")
-    lines.append("")
+        fp.write(f"**実行時間**: {result_dict.get('execution_time', 0):.2f}秒\n")
+    fp.write("\n")
+    fp.write("---\n\n")
     
     # 個人情報の注意書き
-    lines.append(PERSONAL_INFO_WARNING)
-    lines.append("")
-    lines.append("---")
-    lines.append("")
+    fp.write(PERSONAL_INFO_WARNING)
+    fp.write("\n\n")
+    fp.write("---\n\n")
     
     # 総合スコア
-    lines.append("# 総合スコア")
-    lines.append("")
+    fp.write("# 総合スコア\n\n")
     score_total = result_dict.get('score_total', 0)
     score_must = result_dict.get('score_must', 0)
     score_want = result_dict.get('score_want', 0)
     
-    lines.append(f"- **総合スコア**: {score_total}点")
-    lines.append(f"- **Mustスコア**: {score_must}点")
-    lines.append(f"- **Wantスコア**: {score_want}点")
-    lines.append("")
+    fp.write(f"- **総合スコア**: {score_total}点\n")
+    fp.write(f"- **Mustスコア**: {score_must}点\n")
+    fp.write(f"- **Wantスコア**: {score_want}点\n\n")
     
     # サマリ
     summary = result_dict.get('summary', '')
     if summary:
-        lines.append("## サマリ")
-        lines.append("")
-        lines.append(summary)
-        lines.append("")
+        fp.write("## サマリ\n\n")
+        fp.write(summary)
+        fp.write("\n\n")
     
-    lines.append("---")
-    lines.append("")
+    fp.write("---\n\n")
     
     # 要件一覧（Must/Want）
     requirements = result_dict.get('requirements', [])
     if requirements:
-        lines.append("# 抽出された要件")
-        lines.append("")
+        fp.write("# 抽出された要件\n\n")
+        
+        # Must/Wantに1回の走査で振り分け
+        must_requirements, want_requirements = [], []
+        for r in requirements:
+            if r.category == RequirementType.MUST:
+                must_requirements.append(r)
+            elif r.category == RequirementType.WANT:
+                want_requirements.append(r)
         
         # Must要件
-        must_requirements = [r for r in requirements if r.category == RequirementType.MUST]
         if must_requirements:
-            lines.append("## Must要件（必須）")
-            lines.append("")
+            fp.write("## Must要件（必須）\n\n")
             for i, req in enumerate(must_requirements, 1):
-                lines.append(f"### {i}. [{req.req_id}] {req.description}")
+                fp.write(f"### {i}. [{req.req_id}] {req.description}\n")
                 if req.category:
-                    lines.append(f"- **カテゴリ**: {req.category.value}")
-                lines.append("")
+                    fp.write(f"- **カテゴリ**: {req.category.value}\n")
+                fp.write("\n")
         
         # Want要件
-        want_requirements = [r for r in requirements if r.category == RequirementType.WANT]
         if want_requirements:
-            lines.append("## Want要件（歓迎）")
-            lines.append("")
+            fp.write("## Want要件（歓迎）\n\n")
             for i, req in enumerate(want_requirements, 1):
-                lines.append(f"### {i}. [{req.req_id}] {req.description}")
+                fp.write(f"### {i}. [{req.req_id}] {req.description}\n")
                 if req.category:
-                    lines.append(f"- **カテゴリ**: {req.category.value}")
-                lines.append("")
+                    fp.write(f"- **カテゴリ**: {req.category.value}\n")
+                fp.write("\n")
         
-        lines.append("---")
-        lines.append("")
+        fp.write("---\n\n")
     
     # 一致した要件（強み）
     matched = result_dict.get('matched', [])
     if matched:
-        lines.append("# 一致した要件（強み）")
-        lines.append("")
+        fp.write("# 一致した要件（強み）\n\n")
         
         for i, m in enumerate(matched, 1):
             req = m.requirement
             evidence = m.evidence
             
-            lines.append(f"## {i}. [{req.req_id}] {req.description}")
-            lines.append("")
-            lines.append(f"- **一致度**: {evidence.confidence:.0%}")
-            lines.append(f"- **要件タイプ**: {req.category.value.upper()}")
+            fp.write(f"## {i}. [{req.req_id}] {req.description}\n\n")
+            fp.write(f"- **一致度**: {evidence.confidence:.0%}\n")
+            fp.write(f"- **要件タイプ**: {req.category.value.upper()}\n")
             if req.category:
-                lines.append(f"- **カテゴリ**: {req.category.value}")
-            lines.append("")
+                fp.write(f"- **カテゴリ**: {req.category.value}\n")
+            fp.write("\n")
             
             # 引用
             if evidence.quotes:
-                lines.append("### 根拠（引用）")
-                lines.append("")
+                fp.write("### 根拠（引用）\n\n")
                 for j, quote in enumerate(evidence.quotes, 1):
-                    # quote.sourceはQuoteSource Enum
-                    quote_source = quote.source.value if hasattr(quote.source, 'value') else str(quote.source)
-                    if quote_source == "resume":
-                        quote_source_label = "職務経歴書"
-                    elif quote_source == "rag":
-                        if hasattr(quote, 'source_id') and quote.source_id is not None:
-                            quote_source_label = f"実績DB #{quote.source_id}"
-                        else:
-                            quote_source_label = "実績DB"
-                    else:
-                        quote_source_label = quote_source
-                    lines.append(f"**引用{j}** ({quote_source_label}):")
-                    lines.append("")
-                    lines.append(f"> {quote.text}")
-                    lines.append("")
+                    quote_source_label = _QUOTE_SOURCE_LABELS[quote.source]
+                    if quote.source == QuoteSource.RAG and quote.source_id is not None:
+                        quote_source_label = f"{quote_source_label} #{quote.source_id}"
+                    fp.write(f"**引用{j}** ({quote_source_label}):\n\n")
+                    fp.write(f"> {quote.text}\n\n")
             
-            lines.append("---")
-            lines.append("")
+            fp.write("---\n\n")
     
     # 不足している要件（ギャップ）
     gaps = result_dict.get('gaps', [])
     if gaps:
-        lines.append("# 不足している要件（ギャップ）")
-        lines.append("")
+        fp.write("# 不足している要件（ギャップ）\n\n")
         
         for i, gap in enumerate(gaps, 1):
             req = gap.requirement
             evidence = gap.evidence
 
-            lines.append(f"## {i}. [{req.req_id}] {req.description}")
-            lines.append("")
-            lines.append(f"- **要件タイプ**: {req.category.value.upper()}")
+            fp.write(f"## {i}. [{req.req_id}] {req.description}\n\n")
+            fp.write(f"- **要件タイプ**: {req.category.value.upper()}\n")
             if req.category:
-                lines.append(f"- **カテゴリ**: {req.category.value}")
+                fp.write(f"- **カテゴリ**: {req.category.value}\n")
             if hasattr(evidence, 'reason') and evidence.reason:
-                lines.append(f"- **不足理由**: {evidence.reason}")
+                fp.write(f"- **不足理由**: {evidence.reason}\n")
             if hasattr(evidence, 'confidence') and evidence.confidence is not None:
-                lines.append(f"- **一致度**: {evidence.confidence:.0%}")
-            lines.append("")
+                fp.write(f"- **一致度**: {evidence.confidence:.0%}\n")
+            fp.write("\n")
         
-        lines.append("---")
-        lines.append("")
+        fp.write("---\n\n")
     
     # 改善案
     improvements = result_dict.get('improvements')
     if improvements:
-        lines.append("# 改善案")
-        lines.append("")
+        fp.write("# 改善案\n\n")
         
         if improvements.overall_strategy:
-            lines.append("## 全体戦略")
-            lines.append("")
-            lines.append(improvements.overall_strategy)
-            lines.append("")
+            fp.write("## 全体戦略\n\n")
+            fp.write(improvements.overall_strategy)
+            fp.write("\n\n")
         
         if improvements.resume_edits:
-            lines.append("## 職務経歴書の編集・追記案")
-            lines.append("")
+            fp.write("## 職務経歴書の編集・追記案\n\n")
             for i, edit in enumerate(improvements.resume_edits, 1):
-                edit_type_label = {"add": "追記", "emphasize": "強調", "rewrite": "書き換え"}.get(edit.edit_type, edit.edit_type)
-                lines.append(f"### {i}. [{edit_type_label}] {edit.target_gap}")
+                edit_type_label = _EDIT_TYPE_LABELS.get(edit.edit_type, edit.edit_type)
+                fp.write(f"### {i}. [{edit_type_label}] {edit.target_gap}\n")
                 if edit.template:
-                    lines.append("**テンプレート**:")
-                    lines.append("")
-                    lines.append("```")
-                    lines.append(edit.template)
-                    lines.append("```")
-                    lines.append("")
+                    fp.write("**テンプレート**:\n\n")
+                    fp.write("```\n")
+                    fp.write(edit.template)
+                    fp.write("\n")
+                    fp.write("```\n\n")
                 if edit.example:
-                    lines.append("**具体例**:")
-                    lines.append("")
-                    lines.append("```")
-                    lines.append(edit.example)
-                    lines.append("```")
-                    lines.append("")
+                    fp.write("**具体例**:\n\n")
+                    fp.write("```\n")
+                    fp.write(edit.example)
+                    fp.write("\n")
+                    fp.write("```\n\n")
         
         if improvements.action_items:
-            lines.append("## 行動計画")
-            lines.append("")
+            fp.write("## 行動計画\n\n")
             for plan in improvements.action_items:
                 priority = plan.priority.value if hasattr(plan.priority, 'value') else plan.priority
                 impact = plan.estimated_impact.value if hasattr(plan.estimated_impact, 'value') else plan.estimated_impact
-                lines.append(f"### [{priority}] {plan.action}")
-                lines.append("")
-                lines.append(f"**根拠**: {plan.rationale}")
-                lines.append("")
-                lines.append(f"**期待される効果**: {impact}")
-                lines.append("")
+                fp.write(f"### [{priority}] {plan.action}\n\n")
+                fp.write(f"**根拠**: {plan.rationale}\n\n")
+                fp.write(f"**期待される効果**: {impact}\n\n")
         
-        lines.append("---")
-        lines.append("")
+        fp.write("---\n\n")
     
     # 次アクション
-    lines.append("# 次アクション")
-    lines.append("")
-    lines.append("1. 改善案を参考に職務経歴書を更新")
-    lines.append("2. 応募メール下書きを作成")
-    lines.append("3. 面接想定Q&Aを準備")
-    lines.append("4. 最終確認（誤字脱字、個人情報のマスク）")
-    lines.append("")
-    
-    return "\n".join(lines)
+    fp.write("# 次アクション\n\n")
+    fp.write("1. 改善案を参考に職務経歴書を更新\n")
+    fp.write("2. 応募メール下書きを作成\n")
+    fp.write("3. 面接想定Q&Aを準備\n")
+    fp.write("4. 最終確認（誤字脱字、個人情報のマスク）\n")
 
 
-def export_email_to_txt(email_draft: EmailDraft) -> str:
+def export_analysis_to_md(result_dict: Dict[str, Any]) -> str:
     """
-    応募メール下書きをテキスト形式でエクスポート
+    分析結果をMarkdown形式でエクスポート
     
     Args:
-        email_draft: EmailDraftオブジェクト
+        result_dict: 分析結果の辞書（内容はwrite_analysis_mdを参照）
     
     Returns:
-        str: テキスト形式の文字列
+        str: Markdown形式の文字列
     """
-    lines = []
+    buf = io.StringIO()
+    write_analysis_md(result_dict, buf)
+    return buf.getvalue()
+
+
+def write_email_txt(email_draft: EmailDraft, fp: TextIO):
+    """
+    応募メール下書きをテキスト形式で書き出す
     
+    Args:
+        email_draft: EmailDraftオブジェクト
+        fp: 書き込み先（ファイルやio.StringIOなど、テキストを書き込めるオブジェクト）
+    """
     # ヘッダー
-    lines.append("=" * 60)
-    lines.append("応募メール下書き")
-    lines.append("=" * 60)
-    lines.append("")
-    lines.append(f"生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    lines.append("")
-    lines.append("-" * 60)
-    lines.append("")
+    fp.write(_TXT_HEAVY_RULE)
+    fp.write("応募メール下書き\n")
+    fp.write(_TXT_HEAVY_RULE)
+    fp.write("\n")
+    fp.write(f"生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    fp.write(_TXT_RULE)
+    fp.write("\n")
     
     # 個人情報の注意書き
-    lines.append(PERSONAL_INFO_WARNING.replace("**", "").replace("⚠️", "⚠"))
-    lines.append("")
-    lines.append("-" * 60)
-    lines.append("")
+    fp.write(_PERSONAL_INFO_WARNING_TXT)
+    fp.write("\n\n")
+    fp.write(_TXT_RULE)
+    fp.write("\n")
     
     # 件名案
-    lines.append("【件名案】")
-    lines.append("")
+    fp.write("【件名案】\n\n")
     for i, subject in enumerate(email_draft.subject_options, 1):
-        lines.append(f"{i}. {subject}")
-    lines.append("")
-    lines.append("-" * 60)
-    lines.append("")
+        fp.write(f"{i}. {subject}\n")
+    fp.write("\n")
+    fp.write(_TXT_RULE)
+    fp.write("\n")
     
     # 本文
-    lines.append("【本文】")
-    lines.append("")
-    lines.append(email_draft.body)
-    lines.append("")
-    lines.append("-" * 60)
-    lines.append("")
+    fp.write("【本文】\n\n")
+    fp.write(email_draft.body)
+    fp.write("\n\n")
+    fp.write(_TXT_RULE)
+    fp.write("\n")
     
     # 根拠リスト
     if email_draft.evidence_list:
-        lines.append("【根拠リスト】")
-        lines.append("")
+        fp.write("【根拠リスト】\n\n")
         for i, evidence in enumerate(email_draft.evidence_list, 1):
-            lines.append(f"{i}. 主張: {evidence.claim}")
-            lines.append(f"   根拠タイプ: {evidence.evidence_type}")
+            fp.write(f"{i}. 主張: {evidence.claim}\n")
+            fp.write(f"   根拠タイプ: {evidence.evidence_type}\n")
             if evidence.requirement_id:
-                lines.append(f"   対応要件ID: {evidence.requirement_id}")
-            lines.append(f"   根拠テキスト: {evidence.evidence_text}")
-            lines.append("")
-        lines.append("-" * 60)
-        lines.append("")
+                fp.write(f"   対応要件ID: {evidence.requirement_id}\n")
+            fp.write(f"   根拠テキスト: {evidence.evidence_text}\n\n")
+        fp.write(_TXT_RULE)
+        fp.write("\n")
     
     # 注意事項
     if email_draft.notes:
-        lines.append("【注意事項】")
-        lines.append("")
+        fp.write("【注意事項】\n\n")
         for i, note in enumerate(email_draft.notes, 1):
-            lines.append(f"{i}. {note}")
-        lines.append("")
+            fp.write(f"{i}. {note}\n")
+        fp.write("\n")
     
     # 最終確認
-    lines.append("-" * 60)
-    lines.append("")
-    lines.append("【送信前の確認事項】")
-    lines.append("")
-    lines.append("□ 誤字脱字がないか確認")
-    lines.append("□ 企業名・役職名が正しいか確認")
-    lines.append("□ 職務経歴にない経験を断定していないか確認")
-    lines.append("□ 個人情報が含まれていないか確認")
-    lines.append("")
+    fp.write(_TXT_RULE)
+    fp.write("\n")
+    fp.write("【送信前の確認事項】\n\n")
+    fp.write("□ 誤字脱字がないか確認\n")
+    fp.write("□ 企業名・役職名が正しいか確認\n")
+    fp.write("□ 職務経歴にない経験を断定していないか確認\n")
+    fp.write("□ 個人情報が含まれていないか確認\n")
+
+
+def export_email_to_txt(email_draft: EmailDraft) -> str:
+    """
+    応募メール下書きをテキスト形式でエクスポート
+    
+    Args:
+        email_draft: EmailDraftオブジェクト
     
-    return "\n".join(lines)
+    Returns:
+        str: テキスト形式の文字列
+    """
+    buf = io.StringIO()
+    write_email_txt(email_draft, buf)
+    return buf.getvalue()
 
 
-def export_chat_to_md(chat_history: List[tuple], mode: str = "default") -> str:
+def write_chat_md(chat_history: List[tuple], fp: TextIO, mode: str = "default"):
     """
-    求人深掘りチャット履歴をMarkdown形式でエクスポート
+    求人深掘りチャット履歴をMarkdown形式で書き出す
     
     Args:
         chat_history: チャット履歴のリスト [(user_message, assistant_response), ...]
+        fp: 書き込み先（ファイルやio.StringIOなど、テキストを書き込めるオブジェクト）
         mode: モード名（ファイル名に使用）
             - "job_understanding": 求人理解
             - "email_improvement": 応募メール改善
             - "interview_questions": 面接質問作成
-    
-    Returns:
-        str: Markdown形式の文字列
     """
-    lines = []
-    
-    # モード名の表示名
-    mode_display_names = {
-        "job_understanding": "📖 求人理解",
-        "email_improvement": "📧 応募メール改善",
-        "interview_questions": "❓ 面接質問作成",
-        "default": "チャット"
-    }
-    mode_display = mode_display_names.get(mode, mode)
+    mode_display = _MODE_DISPLAY_NAMES.get(mode, mode)
     
     # ヘッダー
-    lines.append("# 求人深掘りチャット履歴")
-    lines.append("")
-    lines.append(f"**生成日時**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    lines.append(f"**モード**: {mode_display}")
-    lines.append(f"**会話数**: {len(chat_history)}件")
-    lines.append("")
-    lines.append("---")
-    lines.append("")
+    fp.write("# 求人深掘りチャット履歴\n\n")
+    fp.write(f"**生成日時**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    fp.write(f"**モード**: {mode_display}\n")
+    fp.write(f"**会話数**: {len(chat_history)}件\n\n")
+    fp.write("---\n\n")
     
     # 個人情報の注意書き
-    lines.append(PERSONAL_INFO_WARNING)
-    lines.append("")
-    lines.append("---")
-    lines.append("")
+    fp.write(PERSONAL_INFO_WARNING)
+    fp.write("\n\n")
+    fp.write("---\n\n")
     
     # チャット履歴
     if not chat_history:
-        lines.append("チャット履歴がありません。")
-        lines.append("")
+        fp.write("チャット履歴がありません。\n")
     else:
         for i, (user_msg, assistant_msg) in enumerate(chat_history, 1):
-            lines.append(f"## 会話 {i}")
-            lines.append("")
-            lines.append("### あなた")
-            lines.append("")
-            lines.append(user_msg)
-            lines.append("")
-            lines.append("### アシスタント")
-            lines.append("")
-            lines.append(assistant_msg)
-            lines.append("")
-            lines.append("---")
-            lines.append("")
-    
-    return "\n".join(lines)
+            if i > 1:
+                fp.write("\n")
+            fp.write(_CHAT_ENTRY_TEMPLATE.format(i=i, user=user_msg, assistant=assistant_msg))
+
 
+def export_chat_to_md(chat_history: List[tuple], mode: str = "default") -> str:
+    """
+    求人深掘りチャット履歴をMarkdown形式でエクスポート
+    
+    Args:
+        chat_history: チャット履歴のリスト [(user_message, assistant_response), ...]
+        mode: モード名（write_chat_mdを参照）
+    
+    Returns:
+        str: Markdown形式の文字列
+    """
+    buf = io.StringIO()
+    write_chat_md(chat_history, buf, mode)
+    return buf.getvalue()
@@ -1,22 +1,202 @@
 """
 F1: 求人票から要件を抽出
-PydanticOutputParser + RetryWithErrorOutputParser で安定化
+PydanticOutputParser + 形式修正（壊れた応答だけをLLMに直させる）で安定化
 """
-import os
 import re
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 
 from models import Requirement, F1Output, RequirementType
+from llm_cache import make_cache_key, invoke_with_cache, store_response
+from llm_client import get_chat_llm
+from utils import normalize_text, truncate_to_tokens
 
 # 環境変数読み込み
 load_dotenv()
 
+# 要件カテゴリごとの重み（スコア計算で使用）
+REQUIREMENT_WEIGHTS = {RequirementType.MUST: 1.0, RequirementType.WANT: 0.5}
+
+# LLMに渡す各コンテキストの上限トークン数
+# 求人票は要件の取りこぼしを防ぐため、貼り付けミスなど極端に長い場合のみ切り詰める
+CONTEXT_TOKEN_BUDGETS = {
+    "job_text": 6000,
+    "company_info": 1000,
+}
+
+# 要件を含まない定型セクションの見出し（「■福利厚生」「【会社概要】」「＜応募方法＞」など、見出し名だけの行）
+_BOILERPLATE_HEADING_PATTERN = re.compile(
+    r'^[■□◆◇●○【＜<［\[《]?\s*(?:福利厚生|会社概要|応募方法)\s*[】＞>］\]》]?\s*[:：]?$'
+)
+
+# 定型セクションの終わりとみなす行（見出し記号で始まる行、要件らしい語を含む行）
+# 見出しの書き方は求人票ごとにまちまちなため、要件を消さないよう迷ったらセクションを終える
+_SECTION_BREAK_PATTERN = re.compile(r'^[■□◆◇●○【＜<［\[《#]')
+_REQUIREMENT_HINT_PATTERN = re.compile(r'必須|歓迎|尚可|資格|要件|スキル|経験|求める|望ましい|required|preferred', re.IGNORECASE)
+
+# 重複判定に使う技術キーワード（英字、カタカナ）
+_TECH_KEYWORD_PATTERN = re.compile(r'[A-Za-z]+|[ァ-ヶー]+')
+
+# fallback抽出で必須/歓迎を判定するキーワード（行ごとに1回の検索で済むよう1つのパターンにまとめる）
+_FALLBACK_MUST_PATTERN = re.compile(r'必須|required|必要な経験|応募資格|〜以上|経験.*年', re.IGNORECASE)
+_FALLBACK_WANT_PATTERN = re.compile(r'歓迎|preferred|尚可|あれば.*良し|望ましい', re.IGNORECASE)
+
+# 会社紹介っぽい要件の判定に使うキーワードと所在地パターン（1回の検索で判定できるようまとめる）
+_COMPANY_INTRO_KEYWORDS = [
+    "設立", "創業", "本社", "所在地", "住所", "資本金", "従業員数",
+    "沿革", "歴史", "事業内容", "事業領域", "サービス", "製品",
+    "東京都", "大阪府", "神奈川県", "愛知県",  # 所在地
+    "年", "月", "日",  # 日付（設立年月日など）
+    "株式会社", "有限会社", "合同会社",  # 会社形態
+]
+_LOCATION_PATTERNS = [
+    r'[都道府県]',
+    r'[市区町村]',
+    r'[0-9]+-[0-9]+',  # 郵便番号
+]
+_COMPANY_INTRO_PATTERN = re.compile("|".join([re.escape(k) for k in _COMPANY_INTRO_KEYWORDS] + _LOCATION_PATTERNS))
+
+# 技術要件の文脈を示すキーワード（含まれる場合は会社紹介とみなさない）
+_TECH_CONTEXT_PATTERN = re.compile("経験|スキル|開発|実装|設計|運用")
+
+# パーサーとプロンプトは入力に依存しないため、モジュール読み込み時に一度だけ構築する
+_PARSER = PydanticOutputParser(pydantic_object=F1Output)
+
+# 固定のルールと出力形式を先頭にまとめ、入力ごとに変わる求人票・企業情報は末尾に置く
+# （プロバイダーのプロンプトキャッシュが共通プレフィックスを再利用できるようにする）
+_PROMPT_TEMPLATE = PromptTemplate(
+    template="""あなたは求人票分析の専門家です。末尾の求人票から、Must要件とWant要件を抽出してください。
+
+抽出ルール：
+1. Must要件：「必須」「〜以上」「経験必須」など、必ず満たすべき条件
+2. Want要件：「歓迎」「尚可」「あれば尚良し」など、あると望ましい条件
+3. 各要件には必ず求人票からの原文引用（job_quote）を含めること
+4. Must要件は最大{max_must}件、Want要件は最大{max_want}件まで
+5. importance（重要度）は1〜5で設定（5が最重要）
+6. req_idは仮でM1,M2...、W1,W2...のように連番を振る（後で採番し直す）
+
+重複・粒度に関する重要ルール：
+7. **同じ内容の重複は絶対に禁止**：MustとWantで同じ技術・経験を重複させない
+   例：「Python経験3年以上」がMustにあれば、Wantに「Python経験」を入れない
+8. **粒度は適切に**：細かすぎず粗すぎず、1要件につき1つの明確なスキル/経験
+   良い例：「Python開発経験3年以上」
+   悪い例：「Python」「3年以上」を別々にする（細かすぎ）
+   悪い例：「PythonとJavaとRubyの経験」（粗すぎ、分割すべき）
+9. **MustとWantの使い分け**：同じ技術でもレベルが違う場合は明示
+   例：Must「Python基本経験」、Want「Python上級（フレームワーク開発経験）」
+
+{format_instructions}
+{company_info_rules}{strict_instruction}
+求人票：
+{job_text}
+{company_info_section}""",
+    input_variables=["job_text", "max_must", "max_want", "strict_instruction", "company_info_section", "company_info_rules"],
+    partial_variables={"format_instructions": _PARSER.get_format_instructions()}
+)
+
+
+# 壊れたJSON応答の修正（長い求人票のプロンプトを送り直さず、短い応答だけを直す）
+F1_FIX_TEMPLATE = """以下の出力は指定の形式を満たしておらず、パースに失敗しました。
+内容（要件・原文引用）は変えずに、形式だけを修正したJSONを出力してください。
+
+【形式】
+{format_instructions}
+
+【元の出力】
+{output}
+
+【エラー】
+{error}
+"""
+
+
+# 応答全体を囲むMarkdownのコードブロック（```json ... ```）
+_CODE_FENCE_PATTERN = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.DOTALL)
+
+
+def _parse_f1_output(content: str) -> F1Output:
+    """
+    F1の応答をパース
+
+    通常はJSONのみが返るため、中間のdictを作らずにmodel_validate_jsonで直接検証する。
+    前置きの文章が付くなど直接読めない場合はPydanticOutputParserで読み直す。
+
+    Args:
+        content: LLMの応答テキスト
+
+    Returns:
+        F1Output: パース結果
+    """
+    match = _CODE_FENCE_PATTERN.match(content)
+    try:
+        return F1Output.model_validate_json(match.group(1) if match else content)
+    except ValueError:
+        return _PARSER.parse(content)
+
+
+def _strip_boilerplate_sections(job_text: str) -> str:
+    """
+    求人票から要件を含まない定型セクション（福利厚生・会社概要・応募方法）を除く
+
+    セクションは見出し行から、空行・見出し記号で始まる行・要件らしい語を含む行の直前までとする。
+
+    Args:
+        job_text: 求人票のテキスト
+
+    Returns:
+        str: 定型セクションを除いた求人票（該当セクションが無い場合はそのまま）
+    """
+    kept_lines = []
+    in_section = False
+    has_body = False
+
+    for line in job_text.split("\n"):
+        stripped = line.strip()
+        if _BOILERPLATE_HEADING_PATTERN.match(stripped):
+            in_section = True
+            has_body = False
+            continue
+
+        if in_section:
+            if not stripped:
+                # 見出し直後の空行は読み飛ばし、本文の後の空行でセクションを終える
+                if not has_body:
+                    continue
+                in_section = False
+            elif _SECTION_BREAK_PATTERN.match(stripped) or _REQUIREMENT_HINT_PATTERN.search(stripped):
+                in_section = False
+            else:
+                has_body = True
+                continue
+
+        kept_lines.append(line)
+
+    return "\n".join(kept_lines)
+
+
+def _fix_output(llm, output: str, error: Exception) -> str:
+    """
+    パースに失敗した応答の形式をLLMで修正する
+
+    Args:
+        llm: 修正に使うLangChainのチャットモデル（温度0）
+        output: パースに失敗した応答テキスト
+        error: パース時の例外
+
+    Returns:
+        str: 修正後の応答テキスト
+    """
+    prompt = F1_FIX_TEMPLATE.format(
+        format_instructions=_PARSER.get_format_instructions(),
+        output=output,
+        error=str(error)[:500]
+    )
+    return llm.invoke(prompt).content
+
 
 def extract_requirements(
     job_text: str,
@@ -49,40 +229,22 @@ def extract_requirements(
     model_name = options.get("model_name", None)
     company_text = options.get("company_text", None)
 
-    # LLMの初期化
-    try:
-        if llm_provider == "anthropic":
-            llm = ChatAnthropic(
-                model=model_name or "claude-3-5-sonnet-20241022",
-                temperature=0.0,
-                api_key=os.getenv("ANTHROPIC_API_KEY")
-            )
-        else:  # openai
-            llm = ChatOpenAI(
-                model=model_name or "gpt-4o-mini",
-                temperature=0.0,
-                api_key=os.getenv("OPENAI_API_KEY")
-            )
-
-        # パーサー設定
-        parser = PydanticOutputParser(pydantic_object=F1Output)
-
-        # プロンプト作成
-        strict_instruction = ""
-        if strict_mode:
-            strict_instruction = "\n注意：曖昧な表現や推測は避け、求人票に明示的に書かれている要件のみを抽出してください。"
-
-        # 企業情報の扱いルール
-        company_info_section = ""
-        company_info_rules = ""
-        if company_text and company_text.strip():
-            # 企業情報を要約（長すぎる場合は先頭1000文字）
-            company_text_trimmed = company_text.strip()[:1000] + "..." if len(company_text.strip()) > 1000 else company_text.strip()
-            company_info_section = f"""
+    # プロンプト作成
+    strict_instruction = ""
+    if strict_mode:
+        strict_instruction = "\n注意：曖昧な表現や推測は避け、求人票に明示的に書かれている要件のみを抽出してください。"
+
+    # 企業情報の扱いルール
+    company_info_section = ""
+    company_info_rules = ""
+    if company_text and company_text.strip():
+        # 企業情報を要約（長すぎる場合は先頭のみ）
+        company_text_trimmed = truncate_to_tokens(company_text.strip(), CONTEXT_TOKEN_BUDGETS["company_info"], suffix="...")
+        company_info_section = f"""
 【企業情報（参考・背景文脈）】
 {company_text_trimmed}
 """
-            company_info_rules = """
+        company_info_rules = """
 会社情報の扱いルール（重要）：
 - 企業情報は「背景文脈」として補助的に利用してください（求人票の理解を深めるため）
 - **会社紹介・沿革・所在地などの情報は要件として抽出しない**
@@ -92,52 +254,40 @@ def extract_requirements(
 - 求人票に明示されていない要件を企業情報から推測して抽出しない
 """
 
-        prompt_template = PromptTemplate(
-            template="""あなたは求人票分析の専門家です。以下の求人票から、Must要件とWant要件を抽出してください。
-
-求人票：
-{job_text}
-{company_info_section}
-抽出ルール：
-1. Must要件：「必須」「〜以上」「経験必須」など、必ず満たすべき条件
-2. Want要件：「歓迎」「尚可」「あれば尚良し」など、あると望ましい条件
-3. 各要件には必ず求人票からの原文引用（job_quote）を含めること
-4. Must要件は最大{max_must}件、Want要件は最大{max_want}件まで
-5. importance（重要度）は1〜5で設定（5が最重要）
-6. req_idは仮でM1,M2...、W1,W2...のように連番を振る（後で採番し直す）
-
-重複・粒度に関する重要ルール：
-7. **同じ内容の重複は絶対に禁止**：MustとWantで同じ技術・経験を重複させない
-   例：「Python経験3年以上」がMustにあれば、Wantに「Python経験」を入れない
-8. **粒度は適切に**：細かすぎず粗すぎず、1要件につき1つの明確なスキル/経験
-   良い例：「Python開発経験3年以上」
-   悪い例：「Python」「3年以上」を別々にする（細かすぎ）
-   悪い例：「PythonとJavaとRubyの経験」（粗すぎ、分割すべき）
-9. **MustとWantの使い分け**：同じ技術でもレベルが違う場合は明示
-   例：Must「Python基本経験」、Want「Python上級（フレームワーク開発経験）」{company_info_rules}{strict_instruction}
+    # 入力トークンを減らすため、定型セクションを除いてから上限で切り詰める
+    # （fallback抽出はLLMを使わないため元の求人票全体を使う）
+    job_text_trimmed = truncate_to_tokens(
+        _strip_boilerplate_sections(job_text), CONTEXT_TOKEN_BUDGETS["job_text"], suffix="..."
+    )
 
-{format_instructions}
-""",
-            input_variables=["job_text", "max_must", "max_want", "strict_instruction", "company_info_section", "company_info_rules"],
-            partial_variables={"format_instructions": parser.get_format_instructions()}
-        )
+    # LLM実行
+    prompt = _PROMPT_TEMPLATE.format(
+        job_text=job_text_trimmed,
+        max_must=max_must,
+        max_want=max_want,
+        strict_instruction=strict_instruction,
+        company_info_section=company_info_section,
+        company_info_rules=company_info_rules
+    )
 
-        # LLM実行
-        prompt = prompt_template.format(
-            job_text=job_text,
-            max_must=max_must,
-            max_want=max_want,
-            strict_instruction=strict_instruction,
-            company_info_section=company_info_section,
-            company_info_rules=company_info_rules
-        )
+    # LLM呼び出し（API・応答形式の失敗のみfallbackに回し、入力準備の不具合は隠さない）
+    try:
+        llm = get_chat_llm(llm_provider, model_name, 0.0)
 
-        # LLM実行とパース（最大3回リトライ）
+        # LLM実行とパース（最大3回リトライ、同一プロンプトはキャッシュを再利用）
+        # 貼り付け方による改行・空白の違いだけの求人票は同じ要件になるため、空白を正規化してキーを作る
+        cache_key = make_cache_key("f1", normalize_text(prompt), llm_provider, model_name, 0.0)
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                output = llm.invoke(prompt)
-                result = parser.parse(output.content)
+                content = invoke_with_cache(llm, prompt, cache_key)
+                try:
+                    result = _parse_f1_output(content)
+                except Exception as parse_error:
+                    # 形式の崩れだけなら修正で済ませ、失敗した場合のみプロンプト全体を送り直す
+                    content = _fix_output(llm, content, parse_error)
+                    result = _parse_f1_output(content)
+                store_response(cache_key, content)
                 requirements = result.requirements
                 break
             except Exception as parse_error:
@@ -175,71 +325,85 @@ def _merge_duplicate_requirements(requirements: List[Requirement]) -> List[Requi
     if len(requirements) <= 1:
         return requirements
 
+    # 比較に使う特徴（小文字化・キーワード集合）は要件ごとに1回だけ計算
+    features = {id(r): _requirement_features(r) for r in requirements}
+
     # ステップ1: MustとWantをまたぐ重複を検出し、Wantを除外
     must_reqs = [r for r in requirements if r.category == RequirementType.MUST]
     want_reqs = [r for r in requirements if r.category == RequirementType.WANT]
 
-    filtered_want_reqs = []
-    for want_req in want_reqs:
-        # Mustに同じ内容がないかチェック
-        has_duplicate_in_must = False
-        for must_req in must_reqs:
-            if _are_similar_requirements(want_req, must_req):
-                # Mustに同じ内容があるので、このWantは除外
-                has_duplicate_in_must = True
-                break
-
-        if not has_duplicate_in_must:
-            filtered_want_reqs.append(want_req)
+    must_features = [features[id(r)] for r in must_reqs]
+    filtered_want_reqs = [
+        want_req for want_req in want_reqs
+        # Mustに同じ内容がある場合、このWantは除外
+        if not any(_are_similar_features(features[id(want_req)], mf) for mf in must_features)
+    ]
 
     # Mustとフィルタリング後のWantを結合
     requirements = must_reqs + filtered_want_reqs
+    req_features = [features[id(r)] for r in requirements]
 
-    # ステップ2: 同じカテゴリ内での重複統合（既存ロジック）
+    # ステップ2: 同じカテゴリ内での重複統合（各要件を先頭の要件と比較してまとめる）
     merged = []
-    used_indices = set()
+    used = [False] * len(requirements)
 
     for i, req1 in enumerate(requirements):
-        if i in used_indices:
+        if used[i]:
             continue
+        used[i] = True
 
         # 同じカテゴリの要件を探す
         similar_reqs = [req1]
-        for j, req2 in enumerate(requirements[i+1:], start=i+1):
-            if j in used_indices:
+        for j in range(i + 1, len(requirements)):
+            if used[j]:
                 continue
 
             # 同じカテゴリで、意味が似ているかチェック
-            if req1.category == req2.category and _are_similar_requirements(req1, req2):
+            req2 = requirements[j]
+            if req1.category == req2.category and _are_similar_features(req_features[i], req_features[j]):
                 similar_reqs.append(req2)
-                used_indices.add(j)
+                used[j] = True
 
-        # 統合
-        if len(similar_reqs) > 1:
-            # 最も詳細な説明を選ぶ、または統合
-            merged_req = _merge_requirements(similar_reqs)
-            merged.append(merged_req)
-        else:
-            merged.append(req1)
-
-        used_indices.add(i)
+        # 統合（最も詳細な説明を選ぶ、または統合）
+        merged.append(_merge_requirements(similar_reqs) if len(similar_reqs) > 1 else req1)
 
     return merged
 
 
-def _are_similar_requirements(req1: Requirement, req2: Requirement) -> bool:
+@dataclass(frozen=True)
+class _RequirementFeatures:
+    """重複判定に使う要件の特徴（要件ごとに1回だけ計算して使い回す）"""
+    desc: str
+    tech_keywords: FrozenSet[str]
+    words: FrozenSet[str]
+    important_words: FrozenSet[str]
+
+
+def _requirement_features(req: Requirement) -> _RequirementFeatures:
+    """要件の説明から重複判定用の特徴を計算"""
+    desc = req.description.lower()
+    words = frozenset(desc.split())
+    return _RequirementFeatures(
+        desc=desc,
+        tech_keywords=frozenset(_TECH_KEYWORD_PATTERN.findall(desc)),
+        words=words,
+        important_words=frozenset(w for w in words if len(w) >= 3),
+    )
+
+
+def _are_similar_features(f1: _RequirementFeatures, f2: _RequirementFeatures) -> bool:
     """
-    2つの要件が同じ意味かどうかを判定
+    事前計算した特徴から、2つの要件が同じ意味かどうかを判定
 
     Args:
-        req1: 要件1
-        req2: 要件2
+        f1: 要件1の特徴
+        f2: 要件2の特徴
 
     Returns:
         bool: 同じ意味ならTrue
     """
-    desc1 = req1.description.lower()
-    desc2 = req2.description.lower()
+    desc1 = f1.desc
+    desc2 = f2.desc
 
     # 1. 完全一致
     if desc1 == desc2:
@@ -249,16 +413,19 @@ def _are_similar_requirements(req1: Requirement, req2: Requirement) -> bool:
     if desc1 in desc2 or desc2 in desc1:
         return True
 
+    # 技術キーワードも単語も1つも共通しない場合、以降の判定はどれも成立しないので打ち切る
+    if f1.tech_keywords.isdisjoint(f2.tech_keywords) and f1.words.isdisjoint(f2.words):
+        return False
+
     # 3. 技術キーワードが一致（カタカナ、英語）
-    tech_keywords1 = set(re.findall(r'[A-Za-z]+|[ァ-ヶー]+', desc1))
-    tech_keywords2 = set(re.findall(r'[A-Za-z]+|[ァ-ヶー]+', desc2))
+    tech_keywords1 = f1.tech_keywords
+    tech_keywords2 = f2.tech_keywords
 
     # 技術キーワードが2つ以上一致し、それが主要キーワードの場合
     common_tech = tech_keywords1 & tech_keywords2
     if len(common_tech) >= 2:
         # 長いキーワード（3文字以上）が含まれている場合
-        long_common = {k for k in common_tech if len(k) >= 3}
-        if long_common:
+        if any(len(k) >= 3 for k in common_tech):
             return True
 
     # 4. 同じ技術の異なるレベル表現を検出
@@ -269,8 +436,8 @@ def _are_similar_requirements(req1: Requirement, req2: Requirement) -> bool:
             return True
 
     # 5. キーワードの重複率が高い（80%以上に引き上げ、より厳格に）
-    words1 = set(desc1.split())
-    words2 = set(desc2.split())
+    words1 = f1.words
+    words2 = f2.words
 
     if len(words1) == 0 or len(words2) == 0:
         return False
@@ -278,13 +445,9 @@ def _are_similar_requirements(req1: Requirement, req2: Requirement) -> bool:
     common_words = words1 & words2
     overlap_ratio = len(common_words) / max(len(words1), len(words2))
 
-    # 80%以上のキーワードが一致し、かつ主要キーワードが一致
-    if overlap_ratio >= 0.8:
-        # 主要キーワード（3文字以上の単語）が一致するか
-        important_words1 = {w for w in words1 if len(w) >= 3}
-        important_words2 = {w for w in words2 if len(w) >= 3}
-        if important_words1 & important_words2:
-            return True
+    # 80%以上のキーワードが一致し、かつ主要キーワード（3文字以上の単語）が一致
+    if overlap_ratio >= 0.8 and f1.important_words & f2.important_words:
+        return True
 
     return False
 
@@ -302,27 +465,26 @@ def _merge_requirements(requirements: List[Requirement]) -> Requirement:
     if len(requirements) == 1:
         return requirements[0]
     
-    # 最も詳細な説明を選ぶ（長い説明を優先）
-    merged_desc = max(requirements, key=lambda r: len(r.description)).description
-    
-    # 最高の重要度を採用
-    merged_importance = max(req.importance for req in requirements)
+    # 最も詳細な説明・最高の重要度・最も詳細な引用を1回の走査で選ぶ（同じ長さなら先の要件を優先）
+    first = requirements[0]
+    merged_desc = first.description
+    merged_importance = first.importance
+    merged_quote = first.job_quote
+    for req in requirements[1:]:
+        if len(req.description) > len(merged_desc):
+            merged_desc = req.description
+        if req.importance > merged_importance:
+            merged_importance = req.importance
+        if len(req.job_quote) > len(merged_quote):
+            merged_quote = req.job_quote
     
-    # 最も詳細な引用を選ぶ
-    merged_quote = max(requirements, key=lambda r: len(r.job_quote)).job_quote
-    
-    # 最初の要件のカテゴリとweightを使用
-    category = requirements[0].category
-    weight = requirements[0].weight
-    
-    return Requirement(
-        req_id=requirements[0].req_id,  # 仮ID（後で採番し直す）
-        category=category,
-        description=merged_desc,
-        importance=merged_importance,
-        job_quote=merged_quote,
-        weight=weight
-    )
+    # 最初の要件のID（仮ID、後で採番し直す）・カテゴリ・weightを使用
+    # 各値は統合元の要件で検証済みのため、再検証せずにコピーする
+    return first.model_copy(update={
+        "description": merged_desc,
+        "importance": merged_importance,
+        "job_quote": merged_quote,
+    })
 
 
 def _post_process_requirements(requirements: List[Requirement]) -> List[Requirement]:
@@ -344,19 +506,10 @@ def _post_process_requirements(requirements: List[Requirement]) -> List[Requirem
         new_id = f"REQ_{req_counter:03d}"
 
         # weightを設定
-        weight = 1.0 if req.category == RequirementType.MUST else 0.5
-
-        # 新しいRequirementオブジェクトを作成
-        new_req = Requirement(
-            req_id=new_id,
-            category=req.category,
-            description=req.description,
-            importance=req.importance,
-            job_quote=req.job_quote,
-            weight=weight
-        )
+        weight = REQUIREMENT_WEIGHTS.get(req.category, REQUIREMENT_WEIGHTS[RequirementType.WANT])
 
-        processed.append(new_req)
+        # IDとweightだけを差し替えたコピーを作成（他の値は検証済みのため再検証しない）
+        processed.append(req.model_copy(update={"req_id": new_id, "weight": weight}))
         req_counter += 1
 
     return processed
@@ -372,43 +525,16 @@ def _is_company_intro_requirement(req: Requirement) -> bool:
     Returns:
         bool: 会社紹介っぽい要件ならTrue
     """
-    desc_lower = req.description.lower()
-    quote_lower = req.job_quote.lower()
-    
-    # 会社紹介キーワード
-    company_intro_keywords = [
-        "設立", "創業", "本社", "所在地", "住所", "資本金", "従業員数",
-        "沿革", "歴史", "事業内容", "事業領域", "サービス", "製品",
-        "東京都", "大阪府", "神奈川県", "愛知県",  # 所在地
-        "年", "月", "日",  # 日付（設立年月日など）
-        "株式会社", "有限会社", "合同会社",  # 会社形態
-    ]
-    
-    # 説明文または引用文に会社紹介キーワードが含まれているか
-    for keyword in company_intro_keywords:
-        if keyword in desc_lower or keyword in quote_lower:
-            # ただし、技術要件として使われている場合は除外
-            # 例：「設立10年の会社での経験」は技術要件として有効
-            tech_keywords = ["経験", "スキル", "開発", "実装", "設計", "運用"]
-            has_tech_context = any(tech in desc_lower for tech in tech_keywords)
-            if not has_tech_context:
-                return True
+    # 判定パターンは日本語と数字のみで大文字小文字の区別がないため、小文字化せずにそのまま検索する
+    desc = req.description
     
-    # 所在地パターン（都道府県名のみ、または「〜県〜市」など）
-    location_patterns = [
-        r'[都道府県]',
-        r'[市区町村]',
-        r'[0-9]+-[0-9]+',  # 郵便番号
-    ]
-    for pattern in location_patterns:
-        if re.search(pattern, desc_lower) or re.search(pattern, quote_lower):
-            # 技術要件の文脈がない場合は除外
-            tech_keywords = ["経験", "スキル", "開発", "実装", "設計", "運用"]
-            has_tech_context = any(tech in desc_lower for tech in tech_keywords)
-            if not has_tech_context:
-                return True
+    # 技術要件の文脈がある場合は除外しない
+    # 例：「設立10年の会社での経験」は技術要件として有効
+    if _TECH_CONTEXT_PATTERN.search(desc):
+        return False
     
-    return False
+    # 説明文または引用文に会社紹介キーワード・所在地パターンが含まれているか
+    return bool(_COMPANY_INTRO_PATTERN.search(desc) or _COMPANY_INTRO_PATTERN.search(req.job_quote))
 
 
 def _fallback_extract(job_text: str, max_must: int, max_want: int) -> List[Requirement]:
@@ -423,31 +549,13 @@ def _fallback_extract(job_text: str, max_must: int, max_want: int) -> List[Requi
     req_counter_must = 1
     req_counter_want = 1
 
-    # 必須/歓迎のキーワードパターン
-    must_patterns = [
-        r'必須',
-        r'required',
-        r'必要な経験',
-        r'応募資格',
-        r'〜以上',
-        r'経験.*年'
-    ]
-
-    want_patterns = [
-        r'歓迎',
-        r'preferred',
-        r'尚可',
-        r'あれば.*良し',
-        r'望ましい'
-    ]
-
     for line in lines:
         line = line.strip()
         if not line:
             continue
 
         # カテゴリー判定
-        if any(re.search(p, line, re.IGNORECASE) for p in must_patterns):
+        if _FALLBACK_MUST_PATTERN.search(line):
             # Must要件として抽出
             if req_counter_must <= max_must:
                 requirements.append(Requirement(
@@ -456,11 +564,11 @@ def _fallback_extract(job_text: str, max_must: int, max_want: int) -> List[Requi
                     description=line,
                     importance=3,
                     job_quote=line,
-                    weight=1.0
+                    weight=REQUIREMENT_WEIGHTS[RequirementType.MUST]
                 ))
                 req_counter_must += 1
 
-        elif any(re.search(p, line, re.IGNORECASE) for p in want_patterns):
+        elif _FALLBACK_WANT_PATTERN.search(line):
             # Want要件として抽出
             if req_counter_want <= max_want:
                 requirements.append(Requirement(
@@ -469,7 +577,7 @@ def _fallback_extract(job_text: str, max_must: int, max_want: int) -> List[Requi
                     description=line,
                     importance=2,
                     job_quote=line,
-                    weight=0.5
+                    weight=REQUIREMENT_WEIGHTS[RequirementType.WANT]
                 ))
                 req_counter_want += 1
 
@@ -481,7 +589,7 @@ def _fallback_extract(job_text: str, max_must: int, max_want: int) -> List[Requi
             description="求人票から要件を抽出できませんでした",
             importance=1,
             job_quote=job_text[:100],
-            weight=1.0
+            weight=REQUIREMENT_WEIGHTS[RequirementType.MUST]
         ))
 
     return requirements
@@ -2,13 +2,14 @@
 F2: 職務経歴書から根拠を抽出
 PydanticOutputParser + 原文引用検証で安定化 + セクション分解で精度向上 + RAG検索
 """
+import json
 import os
 import re
-from typing import List, Dict, Optional, Tuple, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Mapping, MutableMapping, Optional, Tuple, Tuple
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_anthropic import ChatAnthropic
+from langchain_openai import OpenAIEmbeddings
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_community.vectorstores import Chroma
@@ -16,6 +17,8 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from pydantic import BaseModel, Field
 
 from models import Requirement, Evidence, F2Output, ConfidenceLevel, Quote, QuoteSource
+from llm_cache import make_cache_key, invoke_with_cache, store_response
+from llm_client import get_chat_llm
 
 # 環境変数読み込み
 load_dotenv()
@@ -54,18 +57,7 @@ def _structure_resume_text(
     
     try:
         # LLMの初期化
-        if llm_provider == "anthropic":
-            llm = ChatAnthropic(
-                model=model_name or "claude-3-5-sonnet-20241022",
-                temperature=0.0,
-                api_key=os.getenv("ANTHROPIC_API_KEY")
-            )
-        else:  # openai
-            llm = ChatOpenAI(
-                model=model_name or "gpt-4o-mini",
-                temperature=0.0,
-                api_key=os.getenv("OPENAI_API_KEY")
-            )
+        llm = get_chat_llm(llm_provider, model_name, 0.0)
         
         # パーサー設定
         parser = PydanticOutputParser(pydantic_object=StructuredResume)
@@ -102,8 +94,10 @@ def _structure_resume_text(
         
         # LLM実行
         prompt = prompt_template.format(resume_text=resume_text_trimmed)
-        output = llm.invoke(prompt)
-        result = parser.parse(output.content)
+        cache_key = make_cache_key("f2_sections", prompt, llm_provider, model_name, 0.0)
+        content = invoke_with_cache(llm, prompt, cache_key)
+        result = parser.parse(content)
+        store_response(cache_key, content)
         
         # 辞書形式に変換
         sections_dict = {}
@@ -121,6 +115,26 @@ def _structure_resume_text(
         return None
 
 
+def structure_resume(resume_text: str, options: Optional[dict] = None) -> Optional[Dict[str, str]]:
+    """
+    職務経歴書をセクションに分解（求人に依存しないため、比較モードでは先行実行して共有する）
+    
+    Args:
+        resume_text: 職務経歴書のテキスト
+        options: オプション辞書（llm_provider, model_name）
+    
+    Returns:
+        Optional[Dict[str, str]]: セクションタイプ -> 内容の辞書。失敗時はNone
+    """
+    if options is None:
+        options = {}
+    return _structure_resume_text(
+        resume_text,
+        options.get("llm_provider", "openai"),
+        options.get("model_name", None)
+    )
+
+
 def _annotate_quote_sources(
     evidence_list: List[Evidence],
     rag_evidence: Dict[str, List[Tuple[str, int]]],
@@ -261,13 +275,19 @@ def _retrieve_rag_evidence(
             rag_evidence, error_msg = handle_rag_initialization_error(init_error, "vectorstore")
             return rag_evidence, error_msg, warning_msg
         
-        # 各要件に対して関連箇所を検索
+        # 各要件の説明（クエリ）を1回のAPI呼び出しでまとめてベクトル化
         rag_evidence = {}
-        for req in requirements:
-            # 要件の説明をクエリとして使用
-            query = req.description
+        try:
+            query_vectors = embeddings.embed_documents([req.description for req in requirements])
+        except Exception as e:
+            query_vectors = None
+            for req in requirements:
+                rag_evidence[req.req_id] = handle_rag_search_error(req.req_id, e)
+        
+        # 各要件に対して関連箇所を検索
+        for req, query_vector in zip(requirements, query_vectors or []):
             try:
-                docs = vectorstore.similarity_search(query, k=top_k)
+                docs = vectorstore.similarity_search_by_vector(query_vector, k=top_k)
                 # チャンクのインデックスを取得（source_idとして使用）
                 rag_results = []
                 for doc in docs:
@@ -303,6 +323,45 @@ def extract_evidence(
     """
     職務経歴書から要件に対する根拠を抽出する（F2）
 
+    RAGのエラー/警告メッセージはoptionsの"rag_error_message"/"rag_warning_message"に書き戻す。
+    メッセージを戻り値で受け取りたい場合はextract_evidence_with_rag_statusを使用する。
+
+    Args:
+        resume_text: 職務経歴書のテキスト
+        requirements: 抽出された要件リスト（F1の出力）
+        options: オプション辞書（extract_evidence_with_rag_statusと同じ）
+
+    Returns:
+        Dict[str, Evidence]: req_id -> Evidence の辞書（全req_idが必ず存在）
+    """
+    if options is None:
+        options = {}
+
+    evidence_map, rag_error_message, rag_warning_message = extract_evidence_with_rag_status(
+        resume_text, requirements, options
+    )
+
+    # エラーメッセージと警告メッセージをoptionsに保存（UI表示用）
+    if rag_error_message:
+        options["rag_error_message"] = rag_error_message
+    if rag_warning_message:
+        options["rag_warning_message"] = rag_warning_message
+
+    return evidence_map
+
+
+def extract_evidence_with_rag_status(
+    resume_text: str,
+    requirements: List[Requirement],
+    options: Optional[Mapping] = None
+) -> Tuple[Dict[str, Evidence], Optional[str], Optional[str]]:
+    """
+    職務経歴書から要件に対する根拠を抽出し、RAGのエラー/警告メッセージと合わせて返す（F2）
+
+    optionsは読み取りのみ行うため、ChainMap等で呼び出し元の辞書を重ねて渡してもよい。
+    options["evidence_cache"]が指定された場合、同じ職務経歴書・実績メモに対して抽出済みの要件
+    （カテゴリと説明文が同一）はキャッシュ済みの根拠を再利用し、未抽出の要件のみLLMに問い合わせる。
+
     Args:
         resume_text: 職務経歴書のテキスト
         requirements: 抽出された要件リスト（F1の出力）
@@ -311,53 +370,211 @@ def extract_evidence(
             - model_name: モデル名
             - verify_quotes: 引用検証を行うか（デフォルト True）
             - achievement_notes: 実績メモのテキスト（オプション）
+            - resume_sections_future: structure_resumeを先行投入したFuture（オプション、
+              比較モードで全求人がセクション分解の結果を共有するために使用）
+            - evidence_cache: 要件単位の根拠キャッシュに使う辞書（オプション、UIではセッションごとの辞書を渡す。
+              未指定の場合は要件単位のキャッシュを行わない）
 
     Returns:
-        Dict[str, Evidence]: req_id -> Evidence の辞書（全req_idが必ず存在）
+        Tuple[Dict[str, Evidence], Optional[str], Optional[str]]:
+            (req_id -> Evidence の辞書（全req_idが必ず存在）, RAGエラーメッセージ, RAG警告メッセージ)
     """
-    # オプションのデフォルト値
     if options is None:
         options = {}
 
+    # 要件単位のキャッシュはセッション内のみで使う（職務経歴書由来の根拠を他のセッションやディスクに残さない）
+    evidence_cache = options.get("evidence_cache")
+    if evidence_cache is None:
+        evidence_map, rag_error_message, rag_warning_message, _ = _extract_evidence_core(
+            resume_text, requirements, options
+        )
+        return evidence_map, rag_error_message, rag_warning_message
+
+    # 要件ごとのキャッシュを確認
+    cache_keys = {req.req_id: _evidence_cache_key(req, resume_text, options) for req in requirements}
+    cached_evidence = {}
+    missing_requirements = []
+    for req in requirements:
+        evidence = _load_cached_evidence(evidence_cache, cache_keys[req.req_id], req.req_id)
+        if evidence is not None:
+            cached_evidence[req.req_id] = evidence
+        else:
+            missing_requirements.append(req)
+
+    # RAGのエラー/警告は根拠と別に保存し、全要件がキャッシュ済みの場合も表示できるようにする
+    rag_status_key = _rag_status_cache_key(requirements, options)
+
+    if not missing_requirements:
+        rag_error_message, rag_warning_message = _load_rag_status(evidence_cache, rag_status_key, requirements, options)
+        return cached_evidence, rag_error_message, rag_warning_message
+
+    evidence_map, rag_error_message, rag_warning_message, llm_req_ids = _extract_evidence_core(
+        resume_text, missing_requirements, options
+    )
+    if rag_status_key is not None:
+        evidence_cache[rag_status_key] = (rag_error_message, rag_warning_message)
+
+    # LLMが実際に返した根拠のみ保存（fallbackや補完で埋めたものは次回も問い合わせる）
+    for req_id in llm_req_ids:
+        if req_id in evidence_map and req_id in cache_keys:
+            evidence_cache[cache_keys[req_id]] = evidence_map[req_id]
+
+    evidence_map.update(cached_evidence)
+    return evidence_map, rag_error_message, rag_warning_message
+
+
+def _evidence_cache_key(requirement: Requirement, resume_text: str, options: Mapping) -> Optional[str]:
+    """
+    要件単位の根拠キャッシュのキーを生成（req_idは実行ごとに変わるため含めない）
+
+    Args:
+        requirement: 要件
+        resume_text: 職務経歴書のテキスト
+        options: オプション辞書
+
+    Returns:
+        Optional[str]: キャッシュキー
+    """
+    key_source = json.dumps(
+        [
+            requirement.category.value,
+            requirement.description,
+            resume_text,
+            options.get("achievement_notes") or "",
+            bool(options.get("verify_quotes", True)),
+        ],
+        ensure_ascii=False
+    )
+    return make_cache_key(
+        "f2_req", key_source, options.get("llm_provider", "openai"), options.get("model_name", None), 0.0
+    )
+
+
+def _rag_status_cache_key(requirements: List[Requirement], options: Mapping) -> Optional[str]:
+    """
+    RAGのエラー/警告メッセージのキャッシュキーを生成
+
+    Args:
+        requirements: 要件リスト
+        options: オプション辞書
+
+    Returns:
+        Optional[str]: キャッシュキー。実績メモが無い（RAGを使わない）場合はNone
+    """
+    achievement_notes = options.get("achievement_notes")
+    if not achievement_notes or not achievement_notes.strip():
+        return None
+    key_source = json.dumps(
+        [achievement_notes, [req.description for req in requirements]],
+        ensure_ascii=False
+    )
+    return make_cache_key("f2_rag_status", key_source, "openai", None, 0.0)
+
+
+def _load_rag_status(
+    evidence_cache: MutableMapping,
+    cache_key: Optional[str],
+    requirements: List[Requirement],
+    options: Mapping
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    全要件の根拠がキャッシュ済みの場合に、RAGのエラー/警告メッセージを取得
+
+    保存済みのメッセージが無い場合のみRAG検索を実行し直して取得する。
+
+    Args:
+        evidence_cache: 要件単位の根拠キャッシュ（セッションごとの辞書）
+        cache_key: _rag_status_cache_keyで生成したキー（Noneの場合はRAGを使わない）
+        requirements: 要件リスト
+        options: オプション辞書
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: (RAGエラーメッセージ, RAG警告メッセージ)
+    """
+    if cache_key is None:
+        return None, None
+
+    rag_status = evidence_cache.get(cache_key)
+    if rag_status is not None:
+        return rag_status
+
+    _, rag_error_message, rag_warning_message = _retrieve_rag_evidence(options.get("achievement_notes"), requirements)
+    evidence_cache[cache_key] = (rag_error_message, rag_warning_message)
+    return rag_error_message, rag_warning_message
+
+
+def _load_cached_evidence(evidence_cache: MutableMapping, cache_key: Optional[str], req_id: str) -> Optional[Evidence]:
+    """
+    キャッシュ済みの根拠を取得し、今回の要件IDに付け替える
+
+    Args:
+        evidence_cache: 要件単位の根拠キャッシュ（セッションごとの辞書）
+        cache_key: _evidence_cache_keyで生成したキー
+        req_id: 今回の要件ID
+
+    Returns:
+        Optional[Evidence]: キャッシュ済みの根拠。無い場合はNone
+    """
+    evidence = evidence_cache.get(cache_key)
+    if evidence is None:
+        return None
+    # 呼び出し側で変更されてもキャッシュに影響しないよう、引用リストごと複製する
+    return evidence.model_copy(update={"req_id": req_id}, deep=True)
+
+
+def _extract_evidence_core(
+    resume_text: str,
+    requirements: List[Requirement],
+    options: Mapping
+) -> Tuple[Dict[str, Evidence], Optional[str], Optional[str], List[str]]:
+    """
+    職務経歴書から要件に対する根拠を抽出する（キャッシュを介さない本体）
+
+    Args:
+        resume_text: 職務経歴書のテキスト
+        requirements: 抽出対象の要件リスト
+        options: オプション辞書（extract_evidence_with_rag_statusと同じ）
+
+    Returns:
+        Tuple[Dict[str, Evidence], Optional[str], Optional[str], List[str]]:
+            (req_id -> Evidence の辞書, RAGエラーメッセージ, RAG警告メッセージ,
+             LLMが根拠を返したreq_idのリスト（fallback時は空）)
+    """
     llm_provider = options.get("llm_provider", "openai")
     model_name = options.get("model_name", None)
     verify_quotes = options.get("verify_quotes", True)
     achievement_notes = options.get("achievement_notes", None)
+    resume_sections_future = options.get("resume_sections_future", None)
     
-    # RAG検索で実績メモから根拠候補を取得
+    # RAG検索とセクション分解は互いに独立しているため並列に実行
     rag_evidence = {}
     rag_error_message = None
     rag_warning_message = None
-    if achievement_notes and achievement_notes.strip():
-        rag_evidence, rag_error_message, rag_warning_message = _retrieve_rag_evidence(achievement_notes, requirements)
-        # エラーメッセージと警告メッセージをoptionsに保存（UI表示用）
-        if rag_error_message:
-            options["rag_error_message"] = rag_error_message
-        if rag_warning_message:
-            options["rag_warning_message"] = rag_warning_message
-
-    # 職務経歴書をセクション分解（失敗時は従来通り）
     structured_resume = None
-    try:
-        structured_resume = _structure_resume_text(resume_text, llm_provider, model_name)
-    except Exception as e:
-        print(f"⚠️  セクション分解をスキップ: {e}")
-        structured_resume = None
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # RAG検索で実績メモから根拠候補を取得
+        rag_future = None
+        if achievement_notes and achievement_notes.strip():
+            rag_future = executor.submit(_retrieve_rag_evidence, achievement_notes, requirements)
+
+        # 職務経歴書をセクション分解（失敗時は従来通り、先行投入済みならその結果を使用）
+        structure_future = resume_sections_future or executor.submit(
+            _structure_resume_text, resume_text, llm_provider, model_name
+        )
+
+        if rag_future is not None:
+            rag_evidence, rag_error_message, rag_warning_message = rag_future.result()
+
+        try:
+            structured_resume = structure_future.result()
+        except Exception as e:
+            print(f"⚠️  セクション分解をスキップ: {e}")
+            structured_resume = None
 
     # LLMの初期化
+    llm_req_ids = []
     try:
-        if llm_provider == "anthropic":
-            llm = ChatAnthropic(
-                model=model_name or "claude-3-5-sonnet-20241022",
-                temperature=0.0,
-                api_key=os.getenv("ANTHROPIC_API_KEY")
-            )
-        else:  # openai
-            llm = ChatOpenAI(
-                model=model_name or "gpt-4o-mini",
-                temperature=0.0,
-                api_key=os.getenv("OPENAI_API_KEY")
-            )
+        llm = get_chat_llm(llm_provider, model_name, 0.0)
 
         # パーサー設定
         parser = PydanticOutputParser(pydantic_object=F2Output)
@@ -426,8 +643,11 @@ def extract_evidence(
             partial_variables={"format_instructions": parser.get_format_instructions()}
         )
 
-        # LLM実行とパース（最大3回リトライ）
+        # LLM実行とパース（最大3回リトライ、同一プロンプトはキャッシュを再利用）
+        # temperature=0では同じプロンプトを再送しても同じ誤りを繰り返しやすいため、
+        # リトライ時は前回のパースエラーをプロンプトに添えて修正を促す
         max_retries = 3
+        last_parse_error = None
         for attempt in range(max_retries):
             try:
                 prompt = prompt_template.format(
@@ -436,22 +656,41 @@ def extract_evidence(
                     prompt_note=prompt_note,
                     rag_notes=rag_notes_str
                 )
-                output = llm.invoke(prompt)
-                result = parser.parse(output.content)
+                if last_parse_error is not None:
+                    prompt += (
+                        "\n\n前回の出力は次のエラーのため読み取れませんでした。"
+                        f"出力形式の指示に従って全要件分を出力し直してください。\nエラー: {str(last_parse_error)[:500]}"
+                    )
+                cache_key = make_cache_key("f2", prompt, llm_provider, model_name, 0.0)
+                content = invoke_with_cache(llm, prompt, cache_key)
+                try:
+                    result = parser.parse(content)
+                except Exception as parse_error:
+                    if attempt == max_retries - 1:
+                        raise
+                    # 出力が読み取れなかった場合のみ、エラー内容を次のプロンプトに反映
+                    last_parse_error = parse_error
+                    continue
+                store_response(cache_key, content)
                 evidence_list = result.evidence_list
                 
                 # 引用の出どころを記録（RAG検索結果と照合）
                 evidence_list = _annotate_quote_sources(evidence_list, rag_evidence, resume_text)
                 
+                # 試行が最後まで成功した場合のみ、LLMが返した根拠として記録
+                llm_req_ids = [ev.req_id for ev in evidence_list]
                 break
-            except Exception as parse_error:
+            except Exception as llm_error:
                 if attempt == max_retries - 1:
                     # 最後の試行でも失敗した場合は例外を投げる
-                    raise parse_error
-                # リトライ
+                    raise llm_error
+                # API呼び出し等の失敗は出力の誤りではないため、元のプロンプトでリトライ
+                last_parse_error = None
 
     except Exception as e:
         print(f"⚠️  LLM抽出に失敗、fallbackを使用: {e}")
+        # fallbackの根拠はキャッシュしない
+        llm_req_ids = []
         # Fallback: ルールベース抽出
         evidence_list = _fallback_extract(resume_text, requirements)
         # 引用の出どころを記録（fallbackの場合は全て"resume"）
@@ -503,7 +742,7 @@ def extract_evidence(
     # 全req_idが存在するか確認し、無ければ補完
     evidence_map = _ensure_all_requirements(evidence_map, requirements)
 
-    return evidence_map
+    return evidence_map, rag_error_message, rag_warning_message, llm_req_ids
 
 
 def _verify_quotes(
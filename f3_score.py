@@ -29,6 +29,12 @@ EMPHASIS_KEYWORDS = {
     "バックエンド": ["バックエンド", "API", "サーバー", "データベース", "マイクロサービス", "REST", "GraphQL"],
 }
 
+# 部分一致判定用に小文字化したキーワード（要件ごとに.lower()し直さないよう事前計算）
+_EMPHASIS_KEYWORDS_LOWER = {
+    axis: [keyword.lower() for keyword in keywords]
+    for axis, keywords in EMPHASIS_KEYWORDS.items()
+}
+
 
 def calculate_scores(
     requirements: List[Requirement],
@@ -193,13 +199,11 @@ def _calculate_emphasis_bonus(requirement: Requirement, emphasis_axes: List[str]
             continue
         
         # キーワード辞書から取得、または軸名そのものをキーワードとして使用
-        keywords = EMPHASIS_KEYWORDS.get(axis, [axis])
+        keywords = _EMPHASIS_KEYWORDS_LOWER.get(axis) or [axis.lower()]
         
         # いずれかのキーワードが含まれているか確認
-        for keyword in keywords:
-            if keyword.lower() in search_text:
-                matched_axes.append(axis)
-                break
+        if any(keyword in search_text for keyword in keywords):
+            matched_axes.append(axis)
 
     # マッチした軸数に応じて加点（最大0.1）
     if matched_axes:
@@ -2,12 +2,9 @@
 F4: 改善案を生成
 PydanticOutputParser + Must優先ギャップ絞り込み
 """
-import os
 from typing import List, Optional, Dict
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 
@@ -21,6 +18,8 @@ from models import (
     F4Output,
     RequirementType
 )
+from llm_cache import make_cache_key, invoke_with_cache, store_response
+from llm_client import get_chat_llm
 
 # 環境変数読み込み
 load_dotenv()
@@ -66,18 +65,7 @@ def generate_improvements(
 
     # LLMの初期化
     try:
-        if llm_provider == "anthropic":
-            llm = ChatAnthropic(
-                model=model_name or "claude-3-5-sonnet-20241022",
-                temperature=0.2,  # 少し創造性を持たせる
-                api_key=os.getenv("ANTHROPIC_API_KEY")
-            )
-        else:  # openai
-            llm = ChatOpenAI(
-                model=model_name or "gpt-4o-mini",
-                temperature=0.2,
-                api_key=os.getenv("OPENAI_API_KEY")
-            )
+        llm = get_chat_llm(llm_provider, model_name, 0.2)  # 少し創造性を持たせる
 
         # パーサー設定
         parser = PydanticOutputParser(pydantic_object=F4Output)
@@ -164,8 +152,10 @@ def generate_improvements(
                     gaps_str=gaps_str,
                     company_info_section=company_info_section
                 )
-                output = llm.invoke(prompt)
-                result = parser.parse(output.content)
+                cache_key = make_cache_key("f4", prompt, llm_provider, model_name, 0.2)
+                content = invoke_with_cache(llm, prompt, cache_key)
+                result = parser.parse(content)
+                store_response(cache_key, content)
                 improvements = result.improvements
                 break
             except Exception as parse_error:
@@ -18,6 +18,7 @@ from models import (
     Improvements,
     InterviewQAs
 )
+from llm_cache import make_cache_key, invoke_with_cache, store_response
 
 # 環境変数読み込み
 load_dotenv()
@@ -51,7 +52,7 @@ def evaluate_quality(
     improvements: Improvements,
     interview_qas: Optional[InterviewQAs] = None,
     options: Optional[Dict[str, Any]] = None
-) -> QualityEvaluation:
+) -> Optional[QualityEvaluation]:
     """
     最終出力の品質を評価する（F6）
 
@@ -67,8 +68,13 @@ def evaluate_quality(
             - model_name: モデル名（デフォルト gpt-4o-mini）
 
     Returns:
-        QualityEvaluation: 品質評価結果
+        Optional[QualityEvaluation]: 品質評価結果。評価対象（改善案・面接Q&A）が無い場合はNone
     """
+    # 評価対象が空の場合はLLMを呼ばずに未評価（None）とする
+    # （簡易評価の一律80点を表示すると、評価していない結果に品質スコアが付いて見えるため）
+    if not _has_evaluable_output(improvements, interview_qas):
+        return None
+
     # オプションのデフォルト値
     if options is None:
         options = {}
@@ -113,11 +119,11 @@ def evaluate_quality(
         ]) if gaps else "ギャップなし"
 
         improvements_str = ""
-        if improvements.resume_edits:
+        if improvements and improvements.resume_edits:
             improvements_str += "職務経歴書編集案:\n"
             for edit in improvements.resume_edits[:3]:
                 improvements_str += f"- {edit.template[:100]}...\n"
-        if improvements.action_items:
+        if improvements and improvements.action_items:
             improvements_str += "\n行動計画:\n"
             for item in improvements.action_items[:3]:
                 improvements_str += f"- [{item.priority}] {item.action[:100]}...\n"
@@ -199,7 +205,7 @@ def evaluate_quality(
         job_text_trimmed = job_text[:1500] + "..." if len(job_text) > 1500 else job_text
         resume_text_trimmed = resume_text[:1500] + "..." if len(resume_text) > 1500 else resume_text
 
-        # LLM実行とパース（最大3回リトライ）
+        # LLM実行とパース（最大3回リトライ、同一プロンプトはキャッシュを再利用）
         max_retries = 3
         for attempt in range(max_retries):
             try:
@@ -211,8 +217,10 @@ def evaluate_quality(
                     improvements_str=improvements_str,
                     interview_qa_str=interview_qa_str or "面接Q&Aなし"
                 )
-                output = llm.invoke(prompt)
-                result = parser.parse(output.content)
+                cache_key = make_cache_key("f6", prompt, llm_provider, model_name, 0.0)
+                content = invoke_with_cache(llm, prompt, cache_key)
+                result = parser.parse(content)
+                store_response(cache_key, content)
                 quality_evaluation = result.quality_evaluation
                 break
             except Exception as parse_error:
@@ -229,6 +237,25 @@ def evaluate_quality(
     return quality_evaluation
 
 
+def _has_evaluable_output(
+    improvements: Optional[Improvements],
+    interview_qas: Optional[InterviewQAs]
+) -> bool:
+    """
+    LLMで評価する意味のある出力があるかを判定
+
+    Args:
+        improvements: 改善案（F4の出力）
+        interview_qas: 面接Q&A（F5の出力）
+
+    Returns:
+        bool: 改善案（編集案・行動計画）と面接Q&Aのどちらかが存在する場合True
+    """
+    has_improvements = improvements is not None and bool(improvements.resume_edits or improvements.action_items)
+    has_interview_qas = interview_qas is not None and bool(interview_qas.qa_list)
+    return has_improvements or has_interview_qas
+
+
 def _fallback_evaluate(
     matched: List[RequirementWithEvidence],
     gaps: List[Gap],
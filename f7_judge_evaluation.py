@@ -20,6 +20,7 @@ from models import (
     JudgeEvaluation,
     F7Output
 )
+from llm_cache import make_cache_key, invoke_with_cache, store_response
 
 # 環境変数読み込み
 load_dotenv()
@@ -166,7 +167,7 @@ def evaluate_with_judge(
         job_text_trimmed = job_text[:1500] + "..." if len(job_text) > 1500 else job_text
         resume_text_trimmed = resume_text[:1500] + "..." if len(resume_text) > 1500 else resume_text
         
-        # LLM実行とパース（最大3回リトライ）
+        # LLM実行とパース（最大3回リトライ、同一プロンプトはキャッシュを再利用）
         max_retries = 3
         for attempt in range(max_retries):
             try:
@@ -178,8 +179,10 @@ def evaluate_with_judge(
                     improvements_str=improvements_str,
                     interview_qa_str=interview_qa_str or "面接Q&Aなし"
                 )
-                output = llm.invoke(prompt)
-                result = parser.parse(output.content)
+                cache_key = make_cache_key("f7", prompt, llm_provider, model_name, 0.0)
+                content = invoke_with_cache(llm, prompt, cache_key)
+                result = parser.parse(content)
+                store_response(cache_key, content)
                 judge_evaluation = result.judge_evaluation
                 break
             except Exception as parse_error:
@@ -2,19 +2,26 @@
 求人深掘りチャット
 求人の「この要件は何を意味する？」を解釈、応募戦略を提案、応募メールの改善案を提示
 """
-import os
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+
+from llm_client import get_chat_llm
+from utils import truncate_to_tokens
 
 # 環境変数読み込み
 load_dotenv()
 
+# コンテキストに含める各テキストのトークン数上限
+CONTEXT_TOKEN_BUDGETS = {
+    "job_text": 1200,
+    "company_info": 800,
+    "resume_summary": 400,
+}
 
-def ask_job_chat(
+
+def _prepare_job_chat(
     user_message: str,
     job_text: str,
     resume_text: str,
@@ -26,9 +33,9 @@ def ask_job_chat(
     chat_history: List[tuple],
     mode: str = "job_understanding",
     options: Optional[Dict[str, Any]] = None
-) -> str:
+) -> Tuple[Any, List[BaseMessage]]:
     """
-    求人深掘りチャットに質問する
+    求人深掘りチャットのLLMとメッセージを準備する
     
     Args:
         user_message: ユーザーの質問
@@ -49,7 +56,7 @@ def ask_job_chat(
             - model_name: モデル名（デフォルト gpt-4o-mini）
     
     Returns:
-        str: アシスタントの応答
+        Tuple[Any, List[BaseMessage]]: (LLMインスタンス, LLMに渡すメッセージリスト)
     """
     # オプションのデフォルト値
     if options is None:
@@ -65,19 +72,8 @@ def ask_job_chat(
         else:
             model_name = "gpt-4o-mini"
     
-    # LLMの初期化
-    if llm_provider == "anthropic":
-        llm = ChatAnthropic(
-            model=model_name,
-            temperature=0.7,
-            api_key=os.getenv("ANTHROPIC_API_KEY")
-        )
-    else:  # openai
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=0.7,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+    # LLMの取得（同じ設定のクライアントは再利用）
+    llm = get_chat_llm(llm_provider, model_name, 0.7)
     
     # 入力値の検証とデフォルト値設定
     # None チェックと文字列型への変換
@@ -86,8 +82,8 @@ def ask_job_chat(
     company_text = str(company_text) if company_text is not None and company_text != "" else None
     summary = str(summary) if summary is not None and summary != "" else ""
     
-    # 職務経歴書を要約（長い場合は先頭500文字）
-    resume_summary = resume_text[:500] + "..." if len(resume_text) > 500 else resume_text
+    # 職務経歴書を要約（長い場合は先頭のみ）
+    resume_summary = truncate_to_tokens(resume_text, CONTEXT_TOKEN_BUDGETS["resume_summary"], suffix="...")
     
     # 分析結果を要約
     requirements_summary = "\n".join([
@@ -195,16 +191,16 @@ def ask_job_chat(
     
     # コンテキスト情報を準備
     # job_textが空でない場合のみトリミング
-    if job_text and len(job_text) > 1500:
-        job_text_trimmed = job_text[:1500] + "..."
+    if job_text:
+        job_text_trimmed = truncate_to_tokens(job_text, CONTEXT_TOKEN_BUDGETS["job_text"], suffix="...")
     else:
-        job_text_trimmed = job_text if job_text else "求人票情報なし"
+        job_text_trimmed = "求人票情報なし"
     
     context_info = f"""【求人票】
 {job_text_trimmed}
 
 【企業情報】
-{company_info_str[:1000] + "..." if isinstance(company_info_str, str) and len(company_info_str) > 1000 else company_info_str}
+{truncate_to_tokens(company_info_str, CONTEXT_TOKEN_BUDGETS["company_info"], suffix="...")}
 
 【職務経歴書（要約）】
 {resume_summary}
@@ -236,6 +232,51 @@ def ask_job_chat(
     # 現在のユーザーメッセージを追加
     messages.append(HumanMessage(content=user_message))
     
+    return llm, messages
+
+
+def ask_job_chat(
+    user_message: str,
+    job_text: str,
+    resume_text: str,
+    company_text: Optional[str],
+    requirements: List,
+    matched: List,
+    gaps: List,
+    summary: str,
+    chat_history: List[tuple],
+    mode: str = "job_understanding",
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    求人深掘りチャットに質問する
+
+    Args:
+        user_message: ユーザーの質問
+        job_text: 求人票のテキスト
+        resume_text: 職務経歴書のテキスト（要約して渡す）
+        company_text: 企業情報（オプション）
+        requirements: 全要件リスト
+        matched: マッチした要件と根拠のペア
+        gaps: ギャップのある要件
+        summary: スコアの総評
+        chat_history: チャット履歴 [(user, assistant), ...]
+        mode: チャットモード
+            - "job_understanding": 求人理解
+            - "email_improvement": 応募メール改善
+            - "interview_questions": 面接質問作成
+        options: オプション辞書
+            - llm_provider: "openai" or "anthropic"（デフォルト "openai"）
+            - model_name: モデル名（デフォルト gpt-4o-mini）
+
+    Returns:
+        str: アシスタントの応答
+    """
+    llm, messages = _prepare_job_chat(
+        user_message, job_text, resume_text, company_text, requirements,
+        matched, gaps, summary, chat_history, mode, options
+    )
+
     # LLM実行
     try:
         response = llm.invoke(messages)
@@ -244,6 +285,57 @@ def ask_job_chat(
         return f"エラーが発生しました: {str(e)}"
 
 
+def stream_job_chat(
+    user_message: str,
+    job_text: str,
+    resume_text: str,
+    company_text: Optional[str],
+    requirements: List,
+    matched: List,
+    gaps: List,
+    summary: str,
+    chat_history: List[tuple],
+    mode: str = "job_understanding",
+    options: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """
+    求人深掘りチャットに質問し、応答を生成された順に少しずつ返す（st.write_stream用）
+
+    Args:
+        user_message: ユーザーの質問
+        job_text: 求人票のテキスト
+        resume_text: 職務経歴書のテキスト（要約して渡す）
+        company_text: 企業情報（オプション）
+        requirements: 全要件リスト
+        matched: マッチした要件と根拠のペア
+        gaps: ギャップのある要件
+        summary: スコアの総評
+        chat_history: チャット履歴 [(user, assistant), ...]
+        mode: チャットモード
+            - "job_understanding": 求人理解
+            - "email_improvement": 応募メール改善
+            - "interview_questions": 面接質問作成
+        options: オプション辞書
+            - llm_provider: "openai" or "anthropic"（デフォルト "openai"）
+            - model_name: モデル名（デフォルト gpt-4o-mini）
+
+    Yields:
+        str: アシスタントの応答の断片
+    """
+    llm, messages = _prepare_job_chat(
+        user_message, job_text, resume_text, company_text, requirements,
+        matched, gaps, summary, chat_history, mode, options
+    )
+
+    # LLM実行（ストリーミング）
+    try:
+        for chunk in llm.stream(messages):
+            if isinstance(chunk.content, str) and chunk.content:
+                yield chunk.content
+    except Exception as e:
+        yield f"エラーが発生しました: {str(e)}"
+
+
 
 
 
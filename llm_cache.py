@@ -0,0 +1,201 @@
+"""
+AI応募適合度チェッカー - LLM応答キャッシュ
+temperature=0の呼び出しについて、同一プロンプトの応答を再利用する
+（環境変数LLM_CACHE_SAMPLED=1の場合はtemperature>0の呼び出しも対象、LLM_CACHE_DISABLED=1の場合は無効）
+環境変数LLM_CACHE_DIRを設定した場合はディスクにも保存し、再起動後も再利用する
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+
+# キャッシュの最大件数（超えた場合は最も古く使われたものから削除）
+MAX_CACHE_ENTRIES = 256
+
+# ディスクキャッシュの保存先を指定する環境変数（未設定ならメモリのみ）
+CACHE_DIR_ENV = "LLM_CACHE_DIR"
+
+# キャッシュを無効にする場合に"1"を設定する環境変数
+# キャッシュはプロセス全体（同じサーバーの全セッション）で共有されるため、複数ユーザーで使う環境では無効にする
+CACHE_DISABLED_ENV = "LLM_CACHE_DISABLED"
+
+# temperature>0（生成のたびに応答が変わる）呼び出しもキャッシュする場合に"1"を設定する環境変数
+# 開発中に同じ入力で繰り返し実行する際のコスト削減用（本番では応答の多様性を優先して未設定にする）
+CACHE_SAMPLED_ENV = "LLM_CACHE_SAMPLED"
+
+
+class LLMResponseCache:
+    """LLM応答のインメモリLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_entries: int = MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュから応答を取得（存在しない場合はNone）"""
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+            return content
+
+    def set(self, key: str, content: str):
+        """応答をキャッシュに保存"""
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """キャッシュを全て削除"""
+        with self._lock:
+            self._entries.clear()
+
+
+# プロセス全体で共有するキャッシュ
+_response_cache = LLMResponseCache()
+
+
+def _get_disk_cache_path(cache_key: str) -> Optional[Path]:
+    """ディスクキャッシュのファイルパスを取得（LLM_CACHE_DIR未設定の場合はNone）"""
+    cache_dir = os.getenv(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    return Path(cache_dir).expanduser() / f"{cache_key}.json"
+
+
+@lru_cache(maxsize=None)
+def _ensure_cache_dir(cache_dir: Path):
+    """キャッシュディレクトリを作成（ディレクトリごとに1回だけ実行）"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+def _load_from_disk(cache_key: str) -> Optional[str]:
+    """ディスクキャッシュから応答を読み込む（存在しない・読めない場合はNone）"""
+    path = _get_disk_cache_path(cache_key)
+    if path is None:
+        return None
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f).get("content")
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️  ディスクキャッシュの読み込みに失敗（無視）: {e}")
+        return None
+
+
+def _save_to_disk(cache_key: str, content: str):
+    """応答をディスクキャッシュに保存（書き込み途中のファイルを読まないよう置き換えで保存）"""
+    path = _get_disk_cache_path(cache_key)
+    if path is None:
+        return
+    try:
+        _ensure_cache_dir(path.parent)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"content": content}, f, ensure_ascii=False)
+        tmp_path.replace(path)
+    except Exception as e:
+        print(f"⚠️  ディスクキャッシュの保存に失敗（無視）: {e}")
+
+
+def make_cache_key(
+    namespace: str,
+    prompt: str,
+    llm_provider: str,
+    model_name: Optional[str],
+    temperature: float
+) -> Optional[str]:
+    """
+    LLM応答キャッシュのキーを生成
+
+    Args:
+        namespace: 呼び出し元の識別子（例: "f1", "f2"）
+        prompt: LLMに渡すプロンプト
+        llm_provider: LLMプロバイダー
+        model_name: モデル名（Noneはデフォルトモデル）
+        temperature: 温度
+
+    Returns:
+        Optional[str]: キャッシュキー。temperatureが0以外（応答が非決定的）の場合は
+            LLM_CACHE_SAMPLED=1 が設定されているときのみ生成し、それ以外はNone。
+            LLM_CACHE_DISABLED=1 が設定されている場合は常にNone
+    """
+    if os.getenv(CACHE_DISABLED_ENV) == "1":
+        return None
+    if temperature != 0.0 and os.getenv(CACHE_SAMPLED_ENV) != "1":
+        return None
+
+    key_data = {
+        "namespace": namespace,
+        "prompt": prompt,
+        "llm_provider": llm_provider,
+        "model_name": model_name,
+        "temperature": temperature,
+    }
+    key_str = json.dumps(key_data, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(key_str.encode("utf-8"), digest_size=32).hexdigest()
+
+
+def get_cached_response(cache_key: Optional[str]) -> Optional[str]:
+    """
+    キャッシュ済みの応答テキストを取得
+
+    Args:
+        cache_key: make_cache_keyで生成したキー（Noneの場合はキャッシュしない）
+
+    Returns:
+        Optional[str]: 応答テキスト。キャッシュに無い場合はNone
+    """
+    if cache_key is None:
+        return None
+
+    content = _response_cache.get(cache_key)
+    if content is None:
+        content = _load_from_disk(cache_key)
+        if content is not None:
+            _response_cache.set(cache_key, content)
+    return content
+
+
+def store_response(cache_key: Optional[str], content: str):
+    """
+    応答テキストをキャッシュに保存（パースに成功した応答のみ保存すること）
+
+    Args:
+        cache_key: make_cache_keyで生成したキー（Noneの場合は何もしない）
+        content: 応答テキスト
+    """
+    if cache_key is None:
+        return
+    _response_cache.set(cache_key, content)
+    _save_to_disk(cache_key, content)
+
+
+def invoke_with_cache(llm, prompt: Any, cache_key: Optional[str]) -> str:
+    """
+    キャッシュを優先してLLMを呼び出し、応答テキストを返す
+
+    応答はここでは保存しない。呼び出し元でパースに成功した後にstore_responseで保存する
+    （壊れた応答をキャッシュしてリトライが無効になるのを防ぐため）。
+
+    Args:
+        llm: LangChainのチャットモデル
+        prompt: プロンプト（文字列またはメッセージのリスト）
+        cache_key: make_cache_keyで生成したキー（Noneの場合はキャッシュしない）
+
+    Returns:
+        str: 応答テキスト
+    """
+    content = get_cached_response(cache_key)
+    if content is not None:
+        return content
+    return llm.invoke(prompt).content
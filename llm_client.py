@@ -0,0 +1,41 @@
+"""
+AI応募適合度チェッカー - LLMクライアント
+同じ設定のチャットモデルを使い回し、HTTP接続（TCP/TLS）を呼び出し間で再利用する
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+
+# モデル名が未指定の場合に使うモデル
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+DEFAULT_ANTHROPIC_MODEL = "claude-3-5-sonnet-20241022"
+
+
+@lru_cache(maxsize=8)
+def get_chat_llm(llm_provider: str, model_name: Optional[str], temperature: float):
+    """
+    LLMクライアントを取得（同じ設定のクライアントを使い回し、HTTP接続を再利用する）
+
+    Args:
+        llm_provider: "openai" or "anthropic"
+        model_name: モデル名（Noneの場合はプロバイダーのデフォルトモデル）
+        temperature: 温度
+
+    Returns:
+        LLMインスタンス
+    """
+    # プロバイダーのSDKは読み込みが重いため、使うほうだけを初回呼び出し時に読み込む
+    if llm_provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(
+            model=model_name or DEFAULT_ANTHROPIC_MODEL,
+            temperature=temperature,
+            api_key=os.getenv("ANTHROPIC_API_KEY")
+        )
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=model_name or DEFAULT_OPENAI_MODEL,
+        temperature=temperature,
+        api_key=os.getenv("OPENAI_API_KEY")
+    )
@@ -2,10 +2,21 @@
 AI応募適合度チェッカー - PDFエクスポート機能
 分析結果をPDF形式でダウンロード可能にする
 """
+import heapq
 from io import BytesIO
 from typing import Dict, List
 from fpdf import FPDF
 
+from utils import group_action_items_by_priority
+
+
+# 行動計画の優先度ごとの見出し（表示順）
+ACTION_PRIORITY_HEADINGS = (
+    ("A", "Priority A (High Priority, Short-term)"),
+    ("B", "Priority B (Medium-term)"),
+    ("C", "Priority C (Long-term, Optional)"),
+)
+
 
 def _safe_encode(text: str) -> str:
     """
@@ -158,8 +169,8 @@ def generate_pdf(result: Dict) -> BytesIO:
     matched = result.get('matched', [])
     gaps = result.get('gaps', [])
     
-    # 強みTop3を抽出（簡易版：confidence順）
-    top_strengths = sorted(matched, key=lambda m: -m.evidence.confidence)[:3]
+    # 強みTop3を抽出（簡易版：confidence順、上位3件のみ必要なためヒープで抽出）
+    top_strengths = heapq.nsmallest(3, matched, key=lambda m: -m.evidence.confidence)
     if top_strengths:
         pdf.add_section_title("Top 3 Strengths")
         for i, m in enumerate(top_strengths, 1):
@@ -170,10 +181,8 @@ def generate_pdf(result: Dict) -> BytesIO:
             )
         pdf.ln(3)
     
-    # 致命的ギャップTop3を抽出（Must優先）
-    must_gaps = [g for g in gaps if g.requirement.category.value == "Must"]
-    want_gaps = [g for g in gaps if g.requirement.category.value == "Want"]
-    top_gaps = (must_gaps + want_gaps)[:3]
+    # 致命的ギャップTop3を抽出（Must優先、同順位は元の順序を維持）
+    top_gaps = heapq.nsmallest(3, gaps, key=lambda g: g.requirement.category.value != "Must")
     
     if top_gaps:
         pdf.add_section_title("Top 3 Critical Gaps")
@@ -265,34 +274,18 @@ def generate_pdf(result: Dict) -> BytesIO:
             )
             pdf.ln(2)
             
-            # 優先度別にグループ化
-            priority_a = [a for a in improvements.action_items if a.priority == "A"]
-            priority_b = [a for a in improvements.action_items if a.priority == "B"]
-            priority_c = [a for a in improvements.action_items if a.priority == "C"]
-            
-            if priority_a:
-                pdf.add_text("Priority A (High Priority, Short-term)", font_size=9, style="B")
-                for a in priority_a:
-                    pdf.add_text(f"- {a.action}", font_size=9)
-                    pdf.add_multicell(f"  Rationale: {a.rationale}", font_size=8)
-                    pdf.add_multicell(f"  Expected Impact: {a.estimated_impact}", font_size=8)
-                pdf.ln(2)
-            
-            if priority_b:
-                pdf.add_text("Priority B (Medium-term)", font_size=9, style="B")
-                for a in priority_b:
-                    pdf.add_text(f"- {a.action}", font_size=9)
-                    pdf.add_multicell(f"  Rationale: {a.rationale}", font_size=8)
-                    pdf.add_multicell(f"  Expected Impact: {a.estimated_impact}", font_size=8)
-                pdf.ln(2)
+            # 優先度別にグループ化（1回の走査で振り分け）
+            action_items_by_priority = group_action_items_by_priority(improvements.action_items)
             
-            if priority_c:
-                pdf.add_text("Priority C (Long-term, Optional)", font_size=9, style="B")
-                for a in priority_c:
-                    pdf.add_text(f"- {a.action}", font_size=9)
-                    pdf.add_multicell(f"  Rationale: {a.rationale}", font_size=8)
-                    pdf.add_multicell(f"  Expected Impact: {a.estimated_impact}", font_size=8)
-                pdf.ln(2)
+            for priority, heading in ACTION_PRIORITY_HEADINGS:
+                priority_items = action_items_by_priority[priority]
+                if priority_items:
+                    pdf.add_text(heading, font_size=9, style="B")
+                    for a in priority_items:
+                        pdf.add_text(f"- {a.action}", font_size=9)
+                        pdf.add_multicell(f"  Rationale: {a.rationale}", font_size=8)
+                        pdf.add_multicell(f"  Expected Impact: {a.estimated_impact}", font_size=8)
+                    pdf.ln(2)
     
     # PDFをBytesIOに出力
     pdf_bytes = BytesIO()
@@ -0,0 +1,63 @@
+"""
+F1: 定型セクション（福利厚生・会社概要・応募方法）除去のテスト
+見出しの書き方が混在する求人票でも、要件を消さないことを確認
+"""
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from f1_extract_requirements import _strip_boilerplate_sections
+
+
+def test_company_overview_followed_by_other_heading_style():
+    """■会社概要の後に＜＞見出しが続く場合、必須スキル以降を残す"""
+    job_text = "■会社概要\n株式会社X\n＜必須スキル＞\n・Python 3年以上\n＜歓迎スキル＞\n・AWS"
+    stripped = _strip_boilerplate_sections(job_text)
+    assert "株式会社X" not in stripped
+    assert "＜必須スキル＞\n・Python 3年以上" in stripped
+    assert "・AWS" in stripped
+
+
+def test_plain_heading_after_benefits():
+    """【福利厚生】の後に記号なしの見出しが続く場合、応募資格以降を残す"""
+    job_text = "【福利厚生】\n社保完備\n応募資格\n- Python"
+    assert _strip_boilerplate_sections(job_text) == "応募資格\n- Python"
+
+
+def test_section_ends_at_blank_line():
+    """空行でセクションを終え、続く本文を残す"""
+    job_text = "◆応募方法\nWebフォームから応募\n\nPythonでのAPI開発\n- Django"
+    assert _strip_boilerplate_sections(job_text) == "\nPythonでのAPI開発\n- Django"
+
+
+def test_keyword_inside_other_section_is_kept():
+    """見出し以外の行に含まれる語では除去しない"""
+    job_text = "【仕事内容】\n福利厚生システムの開発\n【必須スキル】\n・Python経験3年以上"
+    assert _strip_boilerplate_sections(job_text) == job_text
+
+
+def test_mixed_heading_styles():
+    """見出し記号が混在する求人票で、定型セクションのみを除く"""
+    job_text = "\n".join([
+        "【必須スキル】",
+        "・Python経験3年以上",
+        "■福利厚生",
+        "・社会保険完備",
+        "・リモート可",
+        "◆歓迎スキル",
+        "・Docker",
+        "＜会社概要＞",
+        "",
+        "設立2010年",
+        "●応募方法：",
+        "Webから",
+    ])
+    assert _strip_boilerplate_sections(job_text) == "\n".join([
+        "【必須スキル】",
+        "・Python経験3年以上",
+        "◆歓迎スキル",
+        "・Docker",
+    ])
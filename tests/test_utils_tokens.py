@@ -0,0 +1,32 @@
+"""
+utils: トークン数による切り詰めのテスト
+特殊トークン文字列を含むユーザー入力でも例外にならないことを確認
+"""
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils import truncate_to_tokens
+
+
+def test_special_token_text_is_not_rejected():
+    """"<|endoftext|>"を含むテキストも通常の文字列として扱う"""
+    text = "Python経験3年以上<|endoftext|>AWS歓迎"
+    assert truncate_to_tokens(text, 1000) == text
+
+
+def test_special_token_text_is_truncated():
+    """特殊トークン文字列を含む長いテキストも上限で切り詰める"""
+    text = "<|endoftext|>" * 500
+    truncated = truncate_to_tokens(text, 10, suffix="...")
+    assert truncated.endswith("...")
+    assert len(truncated) < len(text)
+
+
+def test_estimate_tokens_accepts_special_token_text():
+    """コスト概算も特殊トークン文字列を含むテキストで例外にならない"""
+    from cost_tracker import estimate_tokens
+    assert estimate_tokens("回答<|endoftext|>") > 0
@@ -13,7 +13,17 @@ from models import (
     MatchLevel,
     QuoteSource
 )
-from utils import verify_quote_in_text
+from utils import verify_quotes_in_text
+
+
+# 表示ラベル（再描画のたびに組み立てないよう事前に用意）
+CATEGORY_LABELS = {RequirementType.MUST: "Must", RequirementType.WANT: "Want"}
+CATEGORY_ICONS = {RequirementType.MUST: "🔴", RequirementType.WANT: "🟡"}
+IMPORTANCE_STARS = {importance: "⭐" * importance for importance in range(1, 6)}
+QUOTE_SOURCE_LABELS = {QuoteSource.RESUME: "📄 職務経歴書", QuoteSource.RAG: "🔍 実績DB"}
+
+# 要件一覧で最初に描画する件数（残りは「さらに表示」で描画）
+INITIAL_VISIBLE_REQUIREMENTS = 5
 
 
 def get_match_level(evidence: Evidence) -> MatchLevel:
@@ -75,8 +85,8 @@ def render_requirement_with_evidence(
     match_label, match_color = get_match_level_display(match_level)
     
     # カテゴリラベル
-    category_label = "Must" if requirement.category == RequirementType.MUST else "Want"
-    category_icon = "🔴" if requirement.category == RequirementType.MUST else "🟡"
+    category_label = CATEGORY_LABELS.get(requirement.category, "Want")
+    category_icon = CATEGORY_ICONS.get(requirement.category, "🟡")
     
     # Expanderのタイトル
     title = f"{category_icon} **[{requirement.req_id}]** {requirement.description}"
@@ -87,7 +97,7 @@ def render_requirement_with_evidence(
         with col1:
             st.markdown(f"**カテゴリ**: {category_label}**")
         with col2:
-            st.markdown(f"**重要度**: {'⭐' * requirement.importance}")
+            st.markdown(f"**重要度**: {IMPORTANCE_STARS.get(requirement.importance, '⭐' * requirement.importance)}")
         
         # マッチレベル
         st.markdown(f"**一致度**: {match_label} (信頼度: {evidence.confidence:.0%})")
@@ -101,19 +111,17 @@ def render_requirement_with_evidence(
         
         if quotes_to_display:
             st.markdown("**職務経歴からの引用**:")
-            for quote_obj in quotes_to_display:
+            # 引用検証（職務経歴書の正規化は1回のみ）
+            quote_validity = verify_quotes_in_text(
+                [quote_obj.text for quote_obj in quotes_to_display],
+                resume_text
+            )
+            for quote_obj, is_valid in zip(quotes_to_display, quote_validity):
                 # 引用の出どころラベル
-                source_label = ""
-                if quote_obj.source == QuoteSource.RESUME:
-                    source_label = "📄 職務経歴書"
-                elif quote_obj.source == QuoteSource.RAG:
-                    if quote_obj.source_id is not None and quote_obj.source_id != -1:
-                        source_label = f"🔍 実績DB #{quote_obj.source_id + 1}"
-                    else:
-                        source_label = "🔍 実績DB"
+                source_label = QUOTE_SOURCE_LABELS.get(quote_obj.source, "")
+                if quote_obj.source == QuoteSource.RAG and quote_obj.source_id is not None and quote_obj.source_id != -1:
+                    source_label = f"{source_label} #{quote_obj.source_id + 1}"
                 
-                # 引用検証
-                is_valid = verify_quote_in_text(quote_obj.text, resume_text)
                 if is_valid:
                     st.markdown(f"> **{source_label}** {quote_obj.text}")
                 else:
@@ -129,7 +137,8 @@ def render_requirement_with_evidence(
 def render_requirements_by_category(
     matched: List[RequirementWithEvidence],
     gaps: List[Gap],
-    resume_text: str
+    resume_text: str,
+    result_id: str
 ):
     """
     要件をMust/Wantでセクション分けして表示
@@ -138,6 +147,7 @@ def render_requirements_by_category(
         matched: マッチした要件と根拠のペア
         gaps: ギャップのある要件
         resume_text: 職務経歴書のテキスト（引用検証用）
+        result_id: 分析結果の識別子（「さらに表示」の状態を結果ごとに保持するキーに使用）
     """
     # Must要件とWant要件に分類
     must_matched = [m for m in matched if m.requirement.category == RequirementType.MUST]
@@ -145,6 +155,9 @@ def render_requirements_by_category(
     must_gaps = [g for g in gaps if g.requirement.category == RequirementType.MUST]
     want_gaps = [g for g in gaps if g.requirement.category == RequirementType.WANT]
     
+    # 一覧の保持キー（同じ結果に対する再描画間で「さらに表示」の状態を維持）
+    key_base = f"req_list_{result_id}"
+    
     # Must要件セクション
     if must_matched or must_gaps:
         st.subheader(f"🔴 Must要件（必須）")
@@ -152,24 +165,12 @@ def render_requirements_by_category(
         # マッチしたMust要件
         if must_matched:
             st.markdown(f"**✅ マッチした要件（{len(must_matched)}件）**")
-            for i, m in enumerate(must_matched, 1):
-                render_requirement_with_evidence(
-                    m.requirement,
-                    m.evidence,
-                    resume_text,
-                    show_expanded=(i <= 3)  # 最初の3件は展開
-                )
+            _render_requirement_list(must_matched, resume_text, f"{key_base}_must_matched")
         
         # ギャップのあるMust要件
         if must_gaps:
             st.markdown(f"**❌ ギャップのある要件（{len(must_gaps)}件）**")
-            for i, g in enumerate(must_gaps, 1):
-                render_requirement_with_evidence(
-                    g.requirement,
-                    g.evidence,
-                    resume_text,
-                    show_expanded=(i <= 3)  # 最初の3件は展開
-                )
+            _render_requirement_list(must_gaps, resume_text, f"{key_base}_must_gaps")
         
         st.divider()
     
@@ -180,28 +181,43 @@ def render_requirements_by_category(
         # マッチしたWant要件
         if want_matched:
             st.markdown(f"**✅ マッチした要件（{len(want_matched)}件）**")
-            for i, m in enumerate(want_matched, 1):
-                render_requirement_with_evidence(
-                    m.requirement,
-                    m.evidence,
-                    resume_text,
-                    show_expanded=(i <= 3)  # 最初の3件は展開
-                )
+            _render_requirement_list(want_matched, resume_text, f"{key_base}_want_matched")
         
         # ギャップのあるWant要件
         if want_gaps:
             st.markdown(f"**❌ ギャップのある要件（{len(want_gaps)}件）**")
-            for i, g in enumerate(want_gaps, 1):
-                render_requirement_with_evidence(
-                    g.requirement,
-                    g.evidence,
-                    resume_text,
-                    show_expanded=(i <= 3)  # 最初の3件は展開
-                )
+            _render_requirement_list(want_gaps, resume_text, f"{key_base}_want_gaps")
         
         st.divider()
 
 
+def _render_requirement_list(items: list, resume_text: str, show_all_key: str):
+    """
+    要件一覧を表示（先頭INITIAL_VISIBLE_REQUIREMENTS件のみ描画し、残りは「さらに表示」で描画）
+    
+    Args:
+        items: RequirementWithEvidenceまたはGapのリスト
+        resume_text: 職務経歴書のテキスト（引用検証用）
+        show_all_key: 全件表示状態を保持するsession_stateのキー
+    """
+    show_all = st.session_state.get(show_all_key, False)
+    visible_items = items if show_all else items[:INITIAL_VISIBLE_REQUIREMENTS]
+    
+    for i, item in enumerate(visible_items, 1):
+        render_requirement_with_evidence(
+            item.requirement,
+            item.evidence,
+            resume_text,
+            show_expanded=(i <= 3)  # 最初の3件は展開
+        )
+    
+    hidden_count = len(items) - len(visible_items)
+    if hidden_count > 0:
+        if st.button(f"さらに表示（残り{hidden_count}件）", key=f"{show_all_key}_button"):
+            st.session_state[show_all_key] = True
+            st.rerun()
+
+
 
 
 
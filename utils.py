@@ -3,6 +3,20 @@ AI応募適合度チェッカー - ユーティリティ関数
 引用検証などの共通処理
 """
 import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # 未インストールの環境では文字数で切り詰める
+    tiktoken = None
+
+
+# トークン数の計算に使用するエンコーディング（gpt-4o系と同じ）
+TOKEN_ENCODING_NAME = "o200k_base"
+
+# 連続空白の正規化用
+_WHITESPACE_PATTERN = re.compile(r'\s+')
 
 
 def normalize_text(text: str) -> str:
@@ -25,7 +39,7 @@ def normalize_text(text: str) -> str:
     normalized = normalized.replace("\n", " ").replace("\r", " ")
     
     # 3. 連続空白を1つに統一
-    normalized = re.sub(r'\s+', ' ', normalized)
+    normalized = _WHITESPACE_PATTERN.sub(' ', normalized)
     
     # 4. 前後の空白を削除
     normalized = normalized.strip()
@@ -44,12 +58,42 @@ def verify_quote_in_text(quote: str, text: str) -> bool:
     Returns:
         bool: 引用が見つかった場合True、見つからない場合False
     """
-    if not quote or not text:
+    return verify_quotes_in_text([quote], text)[0]
+
+
+def verify_quotes_in_text(quotes: List[str], text: str) -> List[bool]:
+    """
+    複数の引用をまとめて検証（検索対象テキストの正規化は1回のみ）
+    
+    Args:
+        quotes: 検証対象の引用リスト
+        text: 検索対象のテキスト
+    
+    Returns:
+        List[bool]: 各引用の検証結果（quotesと同じ順序）
+    """
+    if not text:
+        return [False] * len(quotes)
+    
+    normalized_text = normalize_text(text)
+    return [_is_quote_in_normalized_text(quote, normalized_text) for quote in quotes]
+
+
+def _is_quote_in_normalized_text(quote: str, normalized_text: str) -> bool:
+    """
+    正規化済みテキストに対して引用の存在を判定
+    
+    Args:
+        quote: 検証対象の引用
+        normalized_text: 正規化済みの検索対象テキスト
+    
+    Returns:
+        bool: 引用が見つかった場合True、見つからない場合False
+    """
+    if not quote:
         return False
     
-    # 正規化
     normalized_quote = normalize_text(quote)
-    normalized_text = normalize_text(text)
     
     if not normalized_quote or not normalized_text:
         return False
@@ -69,14 +113,79 @@ def verify_quote_in_text(quote: str, text: str) -> bool:
     return False
 
 
+@lru_cache(maxsize=1)
+def get_token_encoding():
+    """
+    トークナイザーを取得（初回のみ読み込み、利用できない場合はNone）
+    
+    Returns:
+        tiktokenのEncoding。tiktoken未インストールや読み込み失敗時はNone
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING_NAME)
+    except Exception as e:
+        print(f"⚠️  トークナイザーの読み込みに失敗、文字数で代用: {e}")
+        return None
 
 
+def encode_tokens(text: str) -> Optional[List[int]]:
+    """
+    テキストをトークン列に変換（トークン数の計算・切り詰めで共通に使う）
+    
+    ユーザー入力やLLM出力に"<|endoftext|>"等の特殊トークン文字列が含まれても例外にせず、通常の文字列として扱う。
+    
+    Args:
+        text: 変換対象のテキスト
+    
+    Returns:
+        Optional[List[int]]: トークン列。トークナイザーが利用できない場合はNone
+    """
+    encoding = get_token_encoding()
+    if encoding is None:
+        return None
+    return encoding.encode_ordinary(text)
 
 
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "") -> str:
+    """
+    テキストをトークン数の上限で切り詰める
+    
+    日本語と英語で1文字あたりのトークン数が大きく異なるため、文字数ではなくトークン数で切り詰める。
+    トークナイザーが利用できない場合は文字数で切り詰める（1文字≒1トークン以上のため安全側）。
+    
+    Args:
+        text: 切り詰め対象のテキスト
+        max_tokens: 最大トークン数
+        suffix: 切り詰めた場合に末尾に付ける文字列（例: "..."）
+    
+    Returns:
+        str: 切り詰め後のテキスト（上限以内の場合はそのまま）
+    """
+    if not text:
+        return ""
+    
+    tokens = encode_tokens(text)
+    if tokens is None:
+        return text[:max_tokens] + suffix if len(text) > max_tokens else text
+    
+    if len(tokens) <= max_tokens:
+        return text
+    return get_token_encoding().decode(tokens[:max_tokens]) + suffix
 
 
-
-
-
-
-
+def group_action_items_by_priority(action_items: list) -> Dict[str, list]:
+    """
+    行動計画を優先度（A/B/C）ごとに1回の走査で振り分ける
+    
+    Args:
+        action_items: ActionItemのリスト
+    
+    Returns:
+        Dict[str, list]: 優先度 -> ActionItemのリスト（"A", "B", "C"のキーは常に存在、元の順序を維持）
+    """
+    groups = {"A": [], "B": [], "C": []}
+    for action_item in action_items:
+        groups.setdefault(action_item.priority, []).append(action_item)
+    return groups